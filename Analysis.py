@@ -6,8 +6,30 @@ import geopandas as gpd
 import matplotlib.cm as cm
 import matplotlib.colors as colors
 from folium.plugins import HeatMap
+import os
+
 import matplotlib.dates as mdates
 
+from chunked import chunked_counts
+from rollups import load_or_build
+
+# Set BODS_CHUNK_SIZE to count the report tables from Data/final.csv that many rows at a time, for tables
+# too large to group in one go; by default they are counted on the loaded DataFrame
+chunk_size = int(os.environ.get('BODS_CHUNK_SIZE', '0'))
+
+
+# Number of disruptions per value of the by column(s), optionally only counting the rows where filter(df) holds
+def report_counts(df, by, filter=None):
+    if chunk_size:
+        return chunked_counts('Data/final.csv', by, chunk_size, filter)
+    if filter is not None:
+        df = df[filter(df)]
+    return df.groupby(by).size()
+
+
+def is_unknown(df):
+    return df['Consequence Severity'] == 'Unknown'
+
 # --------------------------------  Severity Analysis  ---------------------------------------------
 
 # Load your data
@@ -34,7 +56,7 @@ for idx, row in df.iterrows():
 # m.save('consequence_severity_map.html')
 
 # Group the data by location (Latitude and Longitude) and Consequence Severity
-location_severity = df.groupby(['Latitude', 'Longitude', 'Consequence Severity']).size().unstack(fill_value=0)
+location_severity = report_counts(df, ['Latitude', 'Longitude', 'Consequence Severity']).unstack(fill_value=0)
 
 # Determine the most common severity at each location
 location_severity['Most Common Severity'] = location_severity.idxmax(axis=1)
@@ -68,17 +90,11 @@ plt.show(block=True)
 
 # --------------------------------  Time-Space Scatter Plot Of Disruptions  ---------------------------------------------
 
-# Load the data
-df = pd.read_csv('Data/final.csv')  # Ensure this path is correct on your local machine
-
-# Convert 'Start Time' to datetime
-df['Start Time'] = pd.to_datetime(df['Start Time'])
+# Load the hourly/daily/monthly rollups maintained alongside the final table
+rollups = load_or_build('Data/rollups', 'Data/final.csv')
 
-# Set the 'Start Time' as the index
-df.set_index('Start Time', inplace=True)
-
-# Resample the data to daily counts of disruptions
-daily_disruptions = df.resample('D').size()
+# Daily counts of disruptions
+daily_disruptions = rollups.series('day')
 
 # Plot the time series of daily disruptions with larger text and paler grids
 plt.figure(figsize=(14, 7))
@@ -94,17 +110,8 @@ plt.grid(True, which='major', linestyle='-', linewidth='0.5', color='gray', alph
 plt.grid(True, which='minor', linestyle=':', linewidth='0.5', color='gray', alpha=0.3)
 plt.show(block=True)
 
-# Load the data
-df = pd.read_csv('Data/final.csv')  # Ensure this path is correct on your local machine
-
-# Convert 'Start Time' to datetime
-df['Start Time'] = pd.to_datetime(df['Start Time'])
-
-# Extract the hour from the 'Start Time'
-df['Hour'] = df['Start Time'].dt.hour
-
-# Group the data by hour
-hourly_disruptions = df.groupby('Hour').size()
+# Disruptions by hour of the day
+hourly_disruptions = rollups.series('hour_of_day')
 
 # Plot the hourly disruptions with larger text and paler grids
 plt.figure(figsize=(14, 7))
@@ -165,11 +172,11 @@ m.save('disruption_points_map.html')
 # Load your data
 df = pd.read_csv('Data/final.csv')  # Ensure this path is correct on your local machine
 
-# Filter the dataframe to include only disruptions where the operator is responsible, specifically for 'Service Diversion'
-df_filtered = df[df['Efficient Disruption Category'] == 'Service Changes']
-
-# Counting disruptions by Operator and Consequence Severity
-operator_severity_counts = df_filtered.groupby(['Operator_name', 'Consequence Severity']).size().unstack(fill_value=0)
+# Counting disruptions by Operator and Consequence Severity, only including disruptions where the operator is
+# responsible, specifically for 'Service Diversion'
+operator_severity_counts = report_counts(
+    df, ['Operator_name', 'Consequence Severity'],
+    filter=lambda df: df['Efficient Disruption Category'] == 'Service Changes').unstack(fill_value=0)
 
 # Selecting the top 7 companies by total number of disruptions
 top_operators = operator_severity_counts.sum(axis=1).nlargest(7).index
@@ -195,7 +202,7 @@ plt.show(block=True)
 # --------------------------------  Comparative Analysis: Geographical Comparison  -----------------------------------
 
 # Counting disruptions by County and Consequence Severity
-county_severity_counts = df.groupby(['County', 'Consequence Severity']).size().unstack(fill_value=0)
+county_severity_counts = report_counts(df, ['County', 'Consequence Severity']).unstack(fill_value=0)
 
 plt.figure(figsize=(18, 12))
 county_severity_counts.plot(kind='bar', stacked=True, colormap='tab20', figsize=(18, 12))
@@ -217,7 +224,7 @@ plt.show(block=True)
 df = pd.read_csv('Data/final.csv')  # Ensure this path is correct on your local machine
 
 # Group the data by Detailed Disruption Category and Consequence Severity
-severity_vs_reason = df.groupby(['Detailed Disruption Category', 'Consequence Severity']).size().unstack(fill_value=0)
+severity_vs_reason = report_counts(df, ['Detailed Disruption Category', 'Consequence Severity']).unstack(fill_value=0)
 
 # Plotting the data with larger texts and paler grids
 plt.figure(figsize=(16, 10))
@@ -239,11 +246,8 @@ plt.show(block=True)
 # Load your data
 df = pd.read_csv('Data/final.csv')  # Ensure this path is correct on your local machine
 
-# Filter the data to get only the disruptions with 'Unknown' severity
-unknown_severity = df[df['Consequence Severity'] == 'Unknown']
-
-# Group the filtered data by the 'Planned' column
-planned_vs_unplanned = unknown_severity.groupby('Planned').size()
+# Count the disruptions with 'Unknown' severity by the 'Planned' column
+planned_vs_unplanned = report_counts(df, 'Planned', filter=is_unknown)
 
 # Plotting the comparison
 plt.figure(figsize=(10, 6))
@@ -266,13 +270,13 @@ unknown_severity_percentage = (unknown_severity_count / total_disruptions) * 100
 print(f"Unknown severities account for {unknown_severity_percentage:.2f}% of total disruptions.")
 
 # Example: Check the distribution of 'Unknown' severities by operator
-unknown_by_operator = df[df['Consequence Severity'] == 'Unknown'].groupby('Operator_name').size()
+unknown_by_operator = report_counts(df, 'Operator_name', filter=is_unknown)
 print(unknown_by_operator)
 
 # Load your data
 df = pd.read_csv('Data/final.csv')
 # Group by 'Operator_name' and count unknown severities
-unknown_by_operator = unknown_severity.groupby('Operator_name').size()
+unknown_by_operator = report_counts(df, 'Operator_name', filter=is_unknown)
 
 # Plotting the comparison
 plt.figure(figsize=(12, 8))
@@ -288,7 +292,7 @@ plt.grid(True, which='major', linestyle='-', linewidth='0.5', color='gray', alph
 plt.show(block=True)
 # --------------------------------------------
 # Group by 'County' and count unknown severities
-unknown_by_region = unknown_severity.groupby('County').size()
+unknown_by_region = report_counts(df, 'County', filter=is_unknown)
 
 # Plotting the comparison
 plt.figure(figsize=(12, 8))
@@ -304,19 +308,8 @@ plt.grid(True, which='major', linestyle='-', linewidth='0.5', color='gray', alph
 plt.show(block=True)
 #  ---------------------------------------------------------
 
-# Load your data
-df = pd.read_csv('Data/final.csv')
-# Convert 'Start Time' to datetime
-df['Start Time'] = pd.to_datetime(df['Start Time'])
-
-# Set the 'Start Time' as the index
-df.set_index('Start Time', inplace=True)
-
-# Filter for unknown severities
-unknown_severity = df[df['Consequence Severity'] == 'Unknown']
-
-# Resample the data to monthly counts of unknown severities
-monthly_unknown_severities = unknown_severity.resample('M').size()
+# Monthly counts of unknown severities
+monthly_unknown_severities = rollups.series('month', severities=['Unknown'])
 
 # Plotting the monthly unknown severities
 plt.figure(figsize=(10, 6))
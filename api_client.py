@@ -0,0 +1,119 @@
+import json
+import os
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import pandas as pd
+
+from response_cache import ResponseCache
+
+default_url = os.environ.get('BODS_API_URL', 'http://127.0.0.1:8000')
+
+
+# Function to turn filter arguments into query parameters; lists become repeated parameters.
+# An empty list is sent as one blank value, meaning "match nothing" rather than "no filter".
+def query_string(params):
+    query = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, pd.Timestamp):
+            value = value.isoformat()
+        elif isinstance(value, (list, tuple)):
+            value = [str(item) for item in value] or ['']
+        query[name] = value
+    return urlencode(query, doseq=True)
+
+
+# Function to convert records from the API into a DataFrame with parsed timestamps
+def to_frame(records, columns=None):
+    df = pd.DataFrame(records, columns=columns)
+    for column in ['Start Time', 'End Time']:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], utc=True)
+    return df
+
+
+# Client for api_server.py. The latest cache_size responses are cached by URL and revalidated with
+# If-None-Match, so unchanged data costs the server a 304 instead of a new body.
+class DisruptionAPI:
+    def __init__(self, base_url=default_url, timeout=30, cache_size=64):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_size)
+
+    def get(self, path, **params):
+        url = f"{self.base_url}{path}"
+        query = query_string(params)
+        if query:
+            url += '?' + query
+        cached = self.cache.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        try:
+            with urlopen(Request(url, headers=headers), timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+                etag = response.headers.get('ETag')
+        except HTTPError as error:
+            if error.code == 304 and cached:
+                return cached[1]
+            raise
+        if etag:
+            self.cache.put(url, (etag, payload))
+        return payload
+
+    def options(self):
+        return self.get('/options')
+
+    def disruptions(self, limit=None, offset=None, columns=None, **filters):
+        payload = self.get('/disruptions', limit=limit, offset=offset,
+                           columns=','.join(columns) if columns else None, **filters)
+        return to_frame(payload['rows'], columns)
+
+    def aggregates(self, by, **filters):
+        by = [by] if isinstance(by, str) else by
+        return to_frame(self.get('/aggregates', by=','.join(by), **filters), by + ['Count'])
+
+    def heatmap(self, cell=None, **filters):
+        return self.get('/heatmap', cell=cell, **filters)
+
+    def geojson(self, **filters):
+        return self.get('/geojson', **filters)
+
+    def timeseries(self, granularity='day', **filters):
+        points = self.get('/timeseries', granularity=granularity, **filters)
+        series = pd.Series([count for bucket, count in points], dtype='int64',
+                           index=[bucket for bucket, count in points], name='Count')
+        if granularity != 'hour_of_day':
+            series.index = pd.to_datetime(series.index)
+        return series
+
+    # Disruptions active at 'at' (default now) or during [at, until], most severe first
+    def active(self, at=None, until=None, limit=10, **filters):
+        payload = self.get('/active', at=at, until=until, limit=limit, **filters)
+        return to_frame(payload['rows'])
+
+    # Overlapping pairs (at most limit) and all clusters of disruptions close in space and time
+    def overlaps(self, distance=200, limit=1000, **filters):
+        payload = self.get('/overlaps', distance=distance, limit=limit, **filters)
+        pairs = to_frame(payload['pairs'])
+        for column in ['Overlap Start', 'Overlap End']:
+            if column in pairs:
+                pairs[column] = pd.to_datetime(pairs[column], utc=True)
+        return payload['total_pairs'], pairs, to_frame(payload['clusters'])
+
+    # Scheduled service hit by each disruption, most departures first, plus totals over all matches
+    def impact(self, horizon=None, radius=None, limit=1000, **filters):
+        payload = self.get('/impact', horizon=horizon, radius=radius, limit=limit, **filters)
+        return payload['total'], payload['totals'], to_frame(payload['rows'])
+
+    # Detour summary per disruption (at most limit disruptions)
+    def detours(self, radius=None, limit=200, **filters):
+        return to_frame(self.get('/detours', radius=radius, limit=limit, **filters))
+
+    # Every detour around the stops closed by one disruption
+    def detour(self, number, radius=None):
+        return to_frame(self.get('/detours', number=number, radius=radius))
+
+    def search(self, query, limit=50, **filters):
+        return self.get('/search', q=query, limit=limit, **filters)
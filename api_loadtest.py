@@ -0,0 +1,100 @@
+import argparse
+import json
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from api_client import default_url
+
+# Requests issued by one dashboard visit, used when no paths are given
+dashboard_paths = [
+    '/options',
+    '/disruptions?limit=10',
+    '/aggregates?by=Consequence%20Severity',
+    '/aggregates?by=Operator_name',
+    '/aggregates?by=County',
+    '/aggregates?by=Detailed%20Disruption%20Category,Consequence%20Severity',
+    '/heatmap',
+    '/timeseries?granularity=day',
+    '/search?q=road%20closure',
+]
+
+
+# Function to hit the API from several client threads for a fixed time and report latency percentiles.
+# With revalidate, clients repeat requests with If-None-Match like a browser would.
+def load_test(base_url, paths, clients=16, duration=10.0, revalidate=False, timeout=30):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        etags = {}
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            headers = {'If-None-Match': etags[path]} if revalidate and path in etags else {}
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(base_url + path, headers=headers), timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+                    etags[path] = response.headers.get('ETag')
+            except HTTPError as error:
+                status = error.code
+            except OSError:
+                status = 'error'
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / wall, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None,
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the disruption API locally.')
+    parser.add_argument('paths', nargs='*', help='Request paths; defaults to the dashboard queries')
+    parser.add_argument('--url', default=default_url)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--revalidate', action='store_true', help='Send If-None-Match with known ETags')
+    parser.add_argument('--serve', metavar='CSV', help='Start an in-process server on this table first')
+    parser.add_argument('--workers', type=int, default=8, help='Worker threads of the in-process server')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if args.serve:
+        from api_server import create_server
+
+        server = create_server(args.serve, port=0, workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        results = load_test(url, args.paths or dashboard_paths, args.clients, args.duration, args.revalidate)
+        print(json.dumps(results, indent=2))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,428 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from disruptions import severity_order
+from interval_index import IntervalIndex
+from overlap_join import cluster_pairs, overlapping_pairs, summarise_clusters
+from response_cache import ResponseCache
+from rollups import load_or_build
+from stop_graph import batch_detours, load_or_build as load_stop_graph
+from text_index import load_or_build as load_text_index
+from text_store import TextStore
+from timetable import commuter_impact, load_or_build as load_timetable
+
+# Query parameters accepted by every filtered endpoint, mapped to the columns they filter
+list_filters = {'operator': 'Operator_name', 'severity': 'Consequence Severity', 'county': 'County',
+                'category': 'Detailed Disruption Category'}
+
+# Free-text columns held as integer IDs into a TextStore and only turned back into text for responses
+text_columns = ['Summary', 'Description']
+
+
+# One loaded version of the processed table with everything derived from it. A snapshot is never changed
+# after it is built; a reload builds a new one, so a request sees a single consistent version throughout.
+class Snapshot:
+    def __init__(self, data, texts, intervals, rollups, text_index, version, timetable=None, stop_graph=None):
+        self.data = data
+        self.texts = texts
+        self.intervals = intervals
+        self.rollups = rollups
+        self.text_index = text_index
+        self.version = version
+        self.timetable = timetable
+        self.stop_graph = stop_graph
+
+    # Rows as JSON records, with their texts
+    def records(self, rows):
+        return json.loads(self.texts.decode(rows, text_columns).to_json(orient='records', date_format='iso'))
+
+    # Rows matching the operator/severity/county/category and date filters of a request, out of the given
+    # rows (all rows by default)
+    def filter(self, params, rows=None):
+        rows = self.data if rows is None else rows
+        return rows[self.mask(params, rows)]
+
+    def mask(self, params, rows=None):
+        data = self.data if rows is None else rows
+        mask = np.ones(len(data), dtype=bool)
+        for name, column in list_filters.items():
+            if name in params:
+                mask &= data[column].isin(params[name]).values
+        start, end = timestamp(params, 'start'), timestamp(params, 'end')
+        if start is not None:
+            mask &= (data['Start Time'] >= start).values
+        if end is not None:
+            mask &= (data['End Time'] <= end).values
+        return mask
+
+
+# The current snapshot of the processed table, replaced when final.csv changes
+class DisruptionData:
+    def __init__(self, path, data_directory='Data', check_interval=5, timetable_path=None):
+        self.path = path
+        self.data_directory = data_directory
+        self.check_interval = check_interval
+        # Optional GTFS feed for the timetable-based analyses
+        self.timetable = None
+        self.stop_graph = None
+        if timetable_path is not None:
+            self.timetable = load_timetable(os.path.join(data_directory, 'timetable.pickle'), timetable_path)
+            self.stop_graph = load_stop_graph(os.path.join(data_directory, 'stop_graph.pickle'), timetable_path)
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.checked = 0
+        self.reload_if_changed()
+
+    # The snapshot to answer a request from, reloading it first if final.csv has changed
+    def current(self):
+        self.reload_if_changed()
+        return self.snapshot
+
+    def reload_if_changed(self):
+        if time.monotonic() - self.checked < self.check_interval and self.snapshot is not None:
+            return
+        with self.lock:
+            self.checked = time.monotonic()
+            version = str(os.path.getmtime(self.path))
+            if self.snapshot is not None and version == self.snapshot.version:
+                return
+            data = pd.read_csv(self.path)
+            data['Start Time'] = pd.to_datetime(data['Start Time'], utc=True)
+            data['End Time'] = pd.to_datetime(data['End Time'], utc=True)
+            data['Duration (hours)'] = pd.to_numeric(data['Duration'], errors='coerce')
+            # Repeated notices are stored once instead of once per row. Every snapshot has its own store, so
+            # the texts of a replaced table are freed with it once no request holds it any more.
+            texts = TextStore()
+            data = texts.encode(data, text_columns)
+            rollups = load_or_build(os.path.join(self.data_directory, 'rollups'), self.path)
+            text_index = load_text_index(os.path.join(self.data_directory, 'text_index.pickle'), self.path)
+            # Swapped in with one assignment, so concurrent requests see either the old or the new snapshot
+            self.snapshot = Snapshot(data, texts, IntervalIndex.from_frame(data), rollups, text_index, version,
+                                     self.timetable, self.stop_graph)
+
+
+# Function to read a single optional query parameter; a blank value counts as absent
+def single(params, name, default=None, type=str):
+    return type(params[name][0]) if params.get(name, [''])[0] != '' else default
+
+
+# Function to read an optional timestamp parameter as UTC
+def timestamp(params, name):
+    if params.get(name, [''])[0] == '':
+        return None
+    value = pd.Timestamp(params[name][0])
+    return value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+
+
+# --------------------------------  Endpoints  -----------------------------------
+
+def options_endpoint(store, params):
+    data = store.data
+    return {
+        'operators': sorted(data['Operator_name'].dropna().unique().tolist()),
+        'severities': sorted(data['Consequence Severity'].dropna().unique().tolist()),
+        'counties': sorted(data['County'].dropna().unique().tolist()),
+        'categories': sorted(data['Detailed Disruption Category'].dropna().unique().tolist()),
+        'start': data['Start Time'].min().isoformat() if data['Start Time'].notna().any() else None,
+        'end': data['End Time'].max().isoformat() if data['End Time'].notna().any() else None,
+    }
+
+
+def disruptions_endpoint(store, params):
+    rows = store.filter(params)
+    total = len(rows)
+    offset = single(params, 'offset', 0, int)
+    limit = single(params, 'limit', None, int)
+    rows = store.texts.decode(rows.iloc[offset:offset + limit if limit is not None else None], text_columns)
+    if 'columns' in params:
+        rows = rows[params['columns'][0].split(',')]
+    return {'total': total, 'rows': json.loads(rows.to_json(orient='records', date_format='iso'))}
+
+
+def aggregates_endpoint(store, params):
+    by = single(params, 'by', 'Consequence Severity').split(',')
+    counts = store.filter(params).groupby(by).size()
+    records = counts.reset_index(name='Count')
+    return json.loads(records.to_json(orient='records', date_format='iso'))
+
+
+# Disruption counts on a regular lat/lon grid, for heatmaps
+def heatmap_endpoint(store, params):
+    cell = single(params, 'cell', 0.01, float)
+    rows = store.filter(params).dropna(subset=['Latitude', 'Longitude'])
+    grid = pd.DataFrame({
+        'lat': (np.floor(rows['Latitude'] / cell) + 0.5) * cell,
+        'lon': (np.floor(rows['Longitude'] / cell) + 0.5) * cell,
+    })
+    counts = grid.groupby(['lat', 'lon']).size().reset_index(name='count')
+    return counts.round(6).values.tolist()
+
+
+def geojson_endpoint(store, params):
+    rows = store.filter(params).dropna(subset=['Latitude', 'Longitude'])
+    properties = ['Situation Number', 'Summary ID', 'Consequence Severity', 'Operator_name', 'County',
+                  'Detailed Disruption Category', 'Planned', 'Start Time', 'End Time']
+    records = store.records(rows[properties])
+    features = [
+        {'type': 'Feature',
+         'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+         'properties': record}
+        for lon, lat, record in zip(rows['Longitude'], rows['Latitude'], records)
+    ]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def timeseries_endpoint(store, params):
+    # Rollup buckets are naive UTC
+    start, end = timestamp(params, 'start'), timestamp(params, 'end')
+    start = start.tz_convert(None) if start is not None else None
+    end = end.tz_convert(None) if end is not None else None
+    series = store.rollups.series(single(params, 'granularity', 'day'), severities=params.get('severity'),
+                                  operators=params.get('operator'), categories=params.get('category'),
+                                  start=start, end=end)
+    return [[bucket.isoformat() if hasattr(bucket, 'isoformat') else int(bucket), int(count)]
+            for bucket, count in series.items()]
+
+
+# Disruptions active at a moment, or at any time between 'at' and 'until', most severe first.
+# Unknown end times count as still active.
+def active_endpoint(store, params):
+    at = timestamp(params, 'at')
+    until = timestamp(params, 'until') or at
+    # Only the rows active in the window are filtered and ranked
+    rows = store.filter(params, store.data.iloc[store.intervals.overlapping(at, until)])
+    rank = pd.Categorical(rows['Consequence Severity'], categories=severity_order).codes
+    rows = rows.assign(Rank=np.where(rank < 0, len(severity_order), rank))
+    rows = rows.sort_values(['Rank', 'Start Time'], ascending=[True, False], kind='stable').drop(columns='Rank')
+    limit = single(params, 'limit', 10, int)
+    return {'total': len(rows), 'rows': store.records(rows.head(limit))}
+
+
+# Disruptions overlapping in space (within distance metres) and time, as pairs and clusters
+def overlaps_endpoint(store, params):
+    rows = store.filter(params)
+    pairs = overlapping_pairs(rows, single(params, 'distance', 200, float))
+    clusters = summarise_clusters(rows, cluster_pairs(pairs))
+    limit = single(params, 'limit', 1000, int)
+    return {
+        'total_pairs': len(pairs),
+        'pairs': json.loads(pairs.head(limit).to_json(orient='records', date_format='iso')),
+        'clusters': json.loads(clusters.to_json(orient='records', date_format='iso')),
+    }
+
+
+# Scheduled departures, trips and routes through the stops of each disruption while it is active
+def impact_endpoint(store, params):
+    if store.timetable is None:
+        raise ValueError('No timetable is loaded; start the server with --timetable')
+    rows = store.filter(params)
+    impact = commuter_impact(rows, store.timetable, single(params, 'horizon', 7, float),
+                             single(params, 'radius', 2000, float))
+    impact = rows[['Situation Number', 'Summary ID', 'Operator_name', 'Consequence Severity', 'Start Time',
+                   'End Time']].merge(impact, on='Situation Number')
+    impact = impact.sort_values('Scheduled Departures', ascending=False, kind='stable')
+    limit = single(params, 'limit', 1000, int)
+    return {
+        'total': len(impact),
+        'totals': {column: int(impact[column].sum())
+                   for column in ['Scheduled Departures', 'Scheduled Trips', 'Matched Stops']},
+        'rows': store.records(impact.head(limit)),
+    }
+
+
+# Detours around the stops closed by disruptions: one summary row per disruption, or every detour of the
+# disruption given by 'number'. Detours are cached per set of closed stops by the stop graph.
+def detours_endpoint(store, params):
+    if store.stop_graph is None:
+        raise ValueError('No timetable is loaded; start the server with --timetable')
+    radius = single(params, 'radius', 2000, float)
+    if 'number' in params:
+        rows = store.data[store.data['Situation Number'] == params['number'][0]]
+        if rows.empty:
+            raise KeyError(params['number'][0])
+        row = rows.iloc[0]
+        names = row['Stop Name'].split(', ') if isinstance(row['Stop Name'], str) else []
+        detours = store.stop_graph.detours(store.stop_graph.stops.match(names, row['Latitude'], row['Longitude'],
+                                                                        radius))
+        return json.loads(detours.to_json(orient='records'))
+    rows = store.filter(params).head(single(params, 'limit', 200, int))
+    summary = rows[['Situation Number', 'Summary ID', 'Consequence Severity']].merge(
+        batch_detours(rows, store.stop_graph, radius=radius), on='Situation Number')
+    return store.records(summary)
+
+
+def search_endpoint(store, params):
+    hits = store.text_index.search(single(params, 'q', ''), limit=single(params, 'limit', 50, int),
+                                   severities=params.get('severity'), operators=params.get('operator'),
+                                   counties=params.get('county'), start=timestamp(params, 'start'),
+                                   end=timestamp(params, 'end'))
+    return [{'Situation Number': number, 'score': score} for number, score in hits]
+
+
+endpoints = {
+    '/options': options_endpoint,
+    '/disruptions': disruptions_endpoint,
+    '/aggregates': aggregates_endpoint,
+    '/heatmap': heatmap_endpoint,
+    '/geojson': geojson_endpoint,
+    '/timeseries': timeseries_endpoint,
+    '/search': search_endpoint,
+    '/active': active_endpoint,
+    '/overlaps': overlaps_endpoint,
+    '/impact': impact_endpoint,
+    '/detours': detours_endpoint,
+}
+
+# Parameters defaulting to the current time; they are filled in before caching so cached answers stay
+# valid for at most a minute
+time_defaults = {
+    '/active': 'at',
+}
+
+
+# HTTP server that hands connections to a fixed pool of worker threads.
+# A keep-alive connection occupies a worker until it is closed or idle for the handler's timeout.
+class PooledHTTPServer(HTTPServer):
+    def __init__(self, address, handler, workers=8):
+        super().__init__(address, handler)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.connections_lock:
+                self.connections.discard(request)
+            self.shutdown_request(request)
+
+    # Whether connections are waiting for a free worker
+    def saturated(self):
+        with self.connections_lock:
+            return len(self.connections) > self.workers
+
+    def server_close(self):
+        super().server_close()
+        # Wake workers waiting on idle keep-alive connections instead of waiting for clients to hang up
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self.pool.shutdown(wait=True)
+
+
+# Function to build the request handler serving one DisruptionData; endpoints get its current Snapshot.
+# Idle keep-alive connections are closed after keep_alive seconds so they do not hold on to pool workers.
+def make_handler(store, cache, max_age=60, keep_alive=5):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = keep_alive
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            endpoint = endpoints.get(url.path)
+            if endpoint is None:
+                self.send_json(404, {'error': f'Unknown endpoint {url.path}'})
+                return
+
+            snapshot = store.current()
+            params = parse_qs(url.query, keep_blank_values=True)
+            # A blank list filter stands for an empty selection, which matches nothing
+            for name in list_filters:
+                if name in params:
+                    params[name] = [value for value in params[name] if value]
+            if url.path in time_defaults and time_defaults[url.path] not in params:
+                params[time_defaults[url.path]] = [pd.Timestamp.now(tz='UTC').floor('min').isoformat()]
+            key = (snapshot.version, url.path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+            entry = cache.get(key)
+            if entry is None:
+                try:
+                    body = json.dumps(endpoint(snapshot, params)).encode('utf-8')
+                except (KeyError, ValueError, TypeError) as error:
+                    self.send_json(400, {'error': str(error)})
+                    return
+                entry = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+                cache.put(key, entry)
+            body, etag = entry
+
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f'public, max-age={max_age}')
+            self.end_headers()
+            self.wfile.write(body)
+
+        # Connections are not kept alive while others wait for a worker
+        def end_headers(self):
+            if self.server.saturated():
+                self.send_header('Connection', 'close')
+            super().end_headers()
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# Function to create (but not start) the API server
+def create_server(data_path='Data/final.csv', host='127.0.0.1', port=8000, workers=8, cache_size=256,
+                  timetable_path=None):
+    store = DisruptionData(data_path, os.path.dirname(data_path) or '.', timetable_path=timetable_path)
+    return PooledHTTPServer((host, port), make_handler(store, ResponseCache(cache_size)), workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the dashboard queries as a JSON/GeoJSON API.')
+    parser.add_argument('--data', default='Data/final.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=8, help='Worker threads handling requests')
+    parser.add_argument('--cache-size', type=int, default=256, help='Number of responses kept in the cache')
+    parser.add_argument('--timetable', help='GTFS feed (directory or zip) for the commuter impact analyses')
+    args = parser.parse_args()
+
+    server = create_server(args.data, args.host, args.port, args.workers, args.cache_size, args.timetable)
+    print(f"Serving {args.data} on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from disruptions import (aggregate_situations, assign_counties, categorize_disruptions, filter_disruptions,
+                         merge_operator_names, prepare_rows)
+from siri_sx import columns, iter_situations, situation_rows
+from synthetic_siri import generate, generate_operator_catalogue, synthetic_location_name
+
+
+# Function to time a stage, keeping the best of several runs; every run gets a fresh copy of its input
+def timed(stage, source, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        data = source.copy() if isinstance(source, pd.DataFrame) else source
+        start = time.perf_counter()
+        result = stage(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Function to parse a snapshot into the per-stop rows the parsing script builds
+def parse(path):
+    data = []
+    for situation in iter_situations(path):
+        data.extend(situation_rows(situation))
+    return pd.DataFrame(data, columns=columns)
+
+
+# Function to run every pipeline stage over one synthetic snapshot and collect the timings
+def run_size(size, directory, repeat, stops_per_situation, text_words, seed):
+    feed = generate(os.path.join(directory, f'sirisx_{size}.xml'), size, stops_per_situation, text_words, seed)
+    operators_df = pd.read_csv(generate_operator_catalogue(os.path.join(directory, 'operators.csv')))
+    results = []
+
+    def record(stage, seconds, rows):
+        results.append({'situations': size, 'stage': stage, 'seconds': seconds, 'rows': int(rows)})
+        print(f"{size:>9} situations  {stage:<20} {seconds:9.3f} s  ({rows} rows)")
+
+    seconds, rows = timed(parse, feed, repeat)
+    record('parse', seconds, len(rows))
+
+    seconds, aggregated = timed(lambda df: aggregate_situations(prepare_rows(df)), rows, repeat)
+    record('aggregate', seconds, len(aggregated))
+
+    seconds, categorised = timed(categorize_disruptions, aggregated, repeat)
+    record('categorise', seconds, len(categorised))
+
+    seconds, merged = timed(lambda df: merge_operator_names(df, operators_df), categorised, repeat)
+    record('operator_merge', seconds, len(merged))
+
+    # Geocoding is replaced by an offline lookup so the stage measures the county assignment itself
+    seconds, final = timed(lambda df: assign_counties(df, location_name=synthetic_location_name), merged, repeat)
+    record('county_assignment', seconds, len(final))
+
+    # Same conversion and filter the dashboard applies on every rerun
+    final['Start Time'] = pd.to_datetime(final['Start Time'], utc=True)
+    final['End Time'] = pd.to_datetime(final['End Time'], utc=True)
+    selected_operators = final['Operator_name'].value_counts().index[:5]
+    selected_severities = ['Normal', 'Unknown']
+    start_date, end_date = final['Start Time'].min(), final['End Time'].max()
+    seconds, filtered = timed(
+        lambda df: filter_disruptions(df, selected_operators, selected_severities, start_date, end_date), final, repeat)
+    record('dashboard_filter', seconds, len(filtered))
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the disruption pipeline on synthetic SIRI-SX feeds.')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma separated numbers of situations')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the best time is kept')
+    parser.add_argument('--min-stops', type=int, default=1)
+    parser.add_argument('--max-stops', type=int, default=8)
+    parser.add_argument('--min-words', type=int, default=10)
+    parser.add_argument('--max-words', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            results.extend(run_size(size, directory, args.repeat, (args.min_stops, args.max_stops),
+                                    (args.min_words, args.max_words), args.seed))
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'parameters': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,126 @@
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from disruptions import assign_counties, categorize_disruptions, get_location_name, merge_operator_names, prepare_rows
+from siri_sx import columns, iter_situations, situation_rows
+
+# Columns taken from the first row of each situation, as in aggregate_situations
+first_columns = ['Operator', 'Summary', 'Description', 'Start Time', 'End Time', 'Planned',
+                 'Consequence Severity', 'Duration', 'Unknown']
+
+
+# Function to stream per-stop rows out of one or more snapshots in DataFrames of at most chunk_size rows
+def iter_row_chunks(snapshot_paths, chunk_size=100000):
+    data = []
+    for path in snapshot_paths:
+        for situation in iter_situations(path):
+            data.extend(situation_rows(situation))
+            if len(data) >= chunk_size:
+                yield pd.DataFrame(data, columns=columns)
+                data = []
+    if data:
+        yield pd.DataFrame(data, columns=columns)
+
+
+# Function to spill row chunks into hash partitions by Situation Number, keeping the original row order.
+# Every situation ends up in exactly one partition, so partitions can be aggregated independently.
+def partition_rows(chunks, directory, partitions=64):
+    os.makedirs(directory, exist_ok=True)
+    for chunk in chunks:
+        buckets = pd.util.hash_pandas_object(chunk['Situation Number'], index=False) % partitions
+        for bucket, part in chunk.groupby(buckets.values, sort=False):
+            path = os.path.join(directory, f'partition_{bucket:04d}.csv')
+            part.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+    return sorted(glob.glob(os.path.join(directory, 'partition_*.csv')))
+
+
+# Function to reduce prepared rows to mergeable partial aggregates per situation
+def partial_aggregate(chunk):
+    grouped = chunk.groupby('Situation Number', sort=False)
+    partial = grouped[first_columns].first()
+    partial['Latitude Sum'] = grouped['Latitude'].sum()
+    partial['Latitude Count'] = grouped['Latitude'].count()
+    partial['Longitude Sum'] = grouped['Longitude'].sum()
+    partial['Longitude Count'] = grouped['Longitude'].count()
+    partial['Stop Names'] = grouped['Stop Name'].agg(lambda x: list(x.unique()))
+    return partial
+
+
+# Function to combine partial aggregates (given in row order) into the same result as aggregate_situations
+def combine_partials(partials):
+    combined = pd.concat(partials)
+    grouped = combined.groupby(level=0, sort=True)
+    # first() skips missing values, exactly like the in-memory 'first' aggregation
+    result = grouped[first_columns].first()
+    result['Stop Name'] = grouped['Stop Names'].agg(lambda x: ', '.join(dict.fromkeys(name for names in x for name in names)))
+    # Means are recombined from sums and counts, which stays exact across chunks
+    result['Latitude'] = grouped['Latitude Sum'].sum() / grouped['Latitude Count'].sum()
+    result['Longitude'] = grouped['Longitude Sum'].sum() / grouped['Longitude Count'].sum()
+    result.index.name = 'Situation Number'
+    return result.reset_index()[['Situation Number', 'Operator', 'Summary', 'Description', 'Start Time', 'End Time',
+                                 'Stop Name', 'Latitude', 'Longitude', 'Planned', 'Consequence Severity',
+                                 'Duration', 'Unknown']]
+
+
+# Function to aggregate one partition file, reading it in chunks so memory stays bounded
+def aggregate_partition(path, chunk_size=100000):
+    partials = []
+    # Partition files are written in row order, so consecutive chunks keep first-of-group semantics
+    for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        partials.append(partial_aggregate(prepare_rows(chunk)))
+    return combine_partials(partials)
+
+
+# Function to run aggregation, categorisation, enrichment and geocoding partition by partition,
+# appending the results to output_path. Partition files go to a private directory inside work_directory,
+# which is the only thing removed afterwards.
+def process_archive(snapshot_paths, operators_df, output_path, work_directory, partitions=64, chunk_size=100000,
+                    location_name=get_location_name):
+    os.makedirs(work_directory, exist_ok=True)
+    partition_directory = tempfile.mkdtemp(prefix='partitions_', dir=work_directory)
+    try:
+        paths = partition_rows(iter_row_chunks(snapshot_paths, chunk_size), partition_directory, partitions)
+
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        county_cache = {}
+        for path in paths:
+            x = categorize_disruptions(aggregate_partition(path, chunk_size))
+            merged_df = merge_operator_names(x, operators_df)
+            merged_df = assign_counties(merged_df, county_cache, location_name)
+            merged_df.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+    finally:
+        shutil.rmtree(partition_directory, ignore_errors=True)
+    return output_path
+
+
+# Function to compute a report group-by over a CSV too large for memory by summing chunk-level counts
+def chunked_counts(path, by, chunk_size=100000, filter=None):
+    total = None
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        if filter is not None:
+            chunk = chunk[filter(chunk)]
+        counts = chunk.groupby(by).size()
+        total = counts if total is None else total.add(counts, fill_value=0)
+    if total is None:
+        return pd.Series(dtype='int64')
+    return total.astype('int64').sort_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process a multi-snapshot archive with bounded memory.')
+    parser.add_argument('snapshots', nargs='+', help='SIRI-SX snapshot files, oldest first')
+    parser.add_argument('--operators', default='Data/bods data catalogue overall/operator_noc_data_catalogue.csv')
+    parser.add_argument('--output', default='Data/final.csv')
+    parser.add_argument('--work', default='Data/partitions', help='Directory in which a temporary partition directory is created')
+    parser.add_argument('--partitions', type=int, default=64)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    process_archive(args.snapshots, pd.read_csv(args.operators), args.output, args.work, args.partitions,
+                    args.chunk_size)
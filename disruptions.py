@@ -0,0 +1,208 @@
+import pandas as pd
+
+from instrumentation import stage
+from text_store import TextStore
+
+# Define the keyword categories in a dictionary
+keyword_categories = {
+    'Service Withdrawal': ['withdrawal'],
+    'Bus Stop Closure': ['stop closure', 'bus stop closure', 'stop closed', 'bus stop suspension', 'bus station'],
+    'Road Closure': ['road closure', 'road will be closed', 'lane is closed', 'road closed', 'drive will be closed',
+                     'road east will be closed', 'lane will be closed', 'street in leeds city centre closed'],
+    'Service Diversion': ['diversion', 'service', 'divert'],
+    'Roadworks': ['roadworks', 'road works', 'line works', 'road conditions', 'surface dressing', 'installation'],
+    'Emergency Closure': ['emergency'],
+    'Special Events': ['event', 'march'],
+    'Maintenance/Repair': ['maintenance', 'repair', 'replacement', 'upgrade', 'water', 'resurfacing', 'renewal', 'junction', 'gas works', 'waterpipe'],
+    'Construction/Demolition': ['construction', 'demolition'],
+    'Incident': ['incident'],
+    'Security Issue': ['police', 'security', 'safety'],
+    'Staff Shortage': ['staff', 'shortage'],
+    'Bridge Issue': ['bridge'],
+    'Traffic': ['traffic'],
+    'Tram Works/Disruption': ['tram'],
+    'Service Change': ['service change']
+}
+
+# Standardize 'Consequence Severity' values by replacing variations with uniform terms
+severity_mapping = {
+    'unknown': 'Unknown',
+    'normal': 'Normal',
+    'severe': 'Severe',
+    'slight': 'Slight',
+    'verySevere': 'Very Severe',
+    'verySlight': 'Very Slight'
+}
+
+# Severities from most to least severe, used to rank disruptions
+severity_order = ['Very Severe', 'Severe', 'Normal', 'Slight', 'Very Slight', 'Unknown']
+
+# List of ceremonial counties in England
+counties = [
+    "Bedfordshire", "Berkshire", "Bristol", "Buckinghamshire", "Cambridgeshire", "Cheshire",
+    "City of London", "Cornwall", "Cumbria", "Derbyshire", "Devon", "Dorset", "Durham",
+    "East Riding of Yorkshire", "East Sussex", "Essex", "Gloucestershire", "Greater London",
+    "Greater Manchester", "Hampshire", "Herefordshire", "Hertfordshire", "Isle of Wight",
+    "Kent", "Lancashire", "Leicestershire", "Lincolnshire", "Merseyside", "Norfolk",
+    "North Yorkshire", "Northamptonshire", "Northumberland", "Nottinghamshire", "Oxfordshire",
+    "Rutland", "Shropshire", "Somerset", "South Yorkshire", "Staffordshire", "Suffolk",
+    "Surrey", "Tyne and Wear", "Warwickshire", "West Midlands", "West Sussex", "West Yorkshire",
+    "Wiltshire", "Worcestershire"
+]
+
+# Operators that don't have full names in the catalogue; the code itself is used as the name
+special_codes = ['SYFT', 'METL', 'SPCT']
+
+
+# Function to convert the raw per-stop columns and derive the duration of each disruption
+def prepare_rows(df):
+    # Convert Start Time and End Time to datetime
+    df['Start Time'] = pd.to_datetime(df['Start Time'], errors='coerce')
+    df['End Time'] = pd.to_datetime(df['End Time'], errors='coerce')
+
+    # Convert Latitude and Longitude to numeric
+    df['Latitude'] = pd.to_numeric(df['Latitude'], errors='coerce')
+    df['Longitude'] = pd.to_numeric(df['Longitude'], errors='coerce')
+
+    # Handle missing End Time by marking them as 'Unknown'
+    df['Unknown'] = df['End Time'].isna()
+
+    # Calculate the duration (in hours) of each disruption; if End Time is missing, mark it as 'Unknown'
+    df['Duration'] = df.apply(lambda row: 'Unknown' if row['Unknown'] else (row['End Time'] - row['Start Time']).total_seconds() / 3600, axis=1)
+    return df
+
+
+# Function to aggregate duplicate information by 'Situation Number' to consolidate data
+def aggregate_situations(df):
+    return df.groupby('Situation Number').agg({
+        'Operator': 'first',
+        'Summary': 'first',
+        'Description': 'first',
+        'Start Time': 'first',
+        'End Time': 'first',
+        'Stop Name': lambda x: ', '.join(x.unique()),
+        'Latitude': 'mean',
+        'Longitude': 'mean',
+        'Planned': 'first',
+        'Consequence Severity': 'first',
+        'Duration': 'first',
+        'Unknown': 'first'
+    }).reset_index()
+
+
+# Function to categorize based on keywords
+def categorize(text, categories):
+    text_lower = text.lower()
+    for category, keywords in categories.items():
+        if any(keyword in text_lower for keyword in keywords):
+            return category
+    return 'Others'
+
+
+# Efficient re-categorization function to group similar categories into broader ones
+def efficient_recategorize(category):
+    if category in ['Bus Stop Closure']:
+        return 'Bus Stop Closure'
+    elif category in ['Road Closure']:
+        return 'Road Closure'
+    elif category in ['Maintenance/Repair', 'Roadworks', 'Construction/Demolition', 'Tram Works/Disruption']:
+        return 'Infrastructure Work'
+    elif category in ['Service Diversion', 'Service Withdrawal', 'Service Change']:
+        return 'Service Changes'
+    elif category in ['Special Events', 'Emergency Closure', 'Security Issue']:
+        return 'Events and Emergency Circumstances'
+    elif category in ['Incident', 'Traffic', 'Bridge Issue']:
+        return 'Incidents'
+    else:
+        return 'Others'
+
+
+# Function to add the detailed and efficient disruption categories to aggregated situations.
+# Categorisation runs once per distinct text; pass a shared TextStore to also reuse results across calls.
+def categorize_disruptions(x, texts=None):
+    if texts is None:
+        texts = TextStore()
+
+    # Apply the categorization function to the "Description" field
+    x['Detailed Disruption Category'] = texts.map(x['Description'], lambda text: categorize(text, keyword_categories), 'category')
+
+    # Re-categorize "Others" using the "Summary" field for more accurate categorization
+    others = x['Detailed Disruption Category'] == 'Others'
+    x.loc[others, 'Detailed Disruption Category'] = texts.map(x.loc[others, 'Summary'], lambda text: categorize(text, keyword_categories), 'category')
+
+    # Apply the final categorization function to the existing "Disruption Category"
+    categories = x['Detailed Disruption Category'].unique()
+    x['Efficient Disruption Category'] = x['Detailed Disruption Category'].map({category: efficient_recategorize(category) for category in categories})
+    return x
+
+
+# Function to standardize severities and attach full operator names from the BODS catalogue
+def merge_operator_names(causes_df, operators_df):
+    causes_df['Consequence Severity'] = causes_df['Consequence Severity'].replace(severity_mapping)
+
+    # Rename columns in operators_df for clarity
+    operators_df = operators_df.copy()
+    operators_df.columns = ['Operator_name', 'Operator']
+
+    # Merge the causes and operators dataframes on the 'Operator' column
+    merged_df = pd.merge(causes_df, operators_df, on='Operator', how='left')
+
+    # Replace missing Operator names with 'Unknown'
+    merged_df['Operator_name'] = merged_df['Operator_name'].fillna('Unknown')
+
+    # Handle operators that doesn't have full names by using the code itself as the operator name
+    merged_df.loc[merged_df['Operator'].isin(special_codes), 'Operator_name'] = merged_df['Operator']
+    return merged_df
+
+
+# Function to get location name from coordinates using geopy
+def get_location_name(lat, lon):
+    from geopy.geocoders import Nominatim
+
+    geolocator = Nominatim(user_agent="geoapiExercises")
+    location = geolocator.reverse((lat, lon), exactly_one=True)
+    return location.address if location else "Unknown Location"
+
+
+# Function to determine the county from a location name
+def determine_county(location_name):
+    for county in counties:
+        if county in location_name:
+            return county
+    return "Unknown"
+
+
+# Function to determine the county for each row based on latitude and longitude.
+# county_cache maps rounded coordinates to counties so a location is only geocoded once.
+def assign_counties(df, county_cache=None, location_name=get_location_name):
+    if county_cache is None:
+        county_cache = {}
+    keys = list(zip(df['Latitude'].round(5), df['Longitude'].round(5)))
+    for key in dict.fromkeys(keys):
+        if key not in county_cache:
+            county_cache[key] = determine_county(location_name(*key))
+    df['County'] = [county_cache[key] for key in keys]
+
+    # Replace 'Unknown' in the 'County' column with 'Liverpool'
+    df.loc[df['County'] == 'Unknown', 'County'] = 'Liverpool'
+    return df
+
+
+# Function to run raw per-stop rows through aggregation, categorisation, operator merge and geocoding
+def process_situations(df, operators_df, county_cache=None, location_name=get_location_name, texts=None):
+    with stage('aggregation', rows=len(df)):
+        x = aggregate_situations(prepare_rows(df))
+    with stage('categorisation', rows=len(x)):
+        x = categorize_disruptions(x, texts)
+    with stage('merge', rows=len(x)):
+        merged_df = merge_operator_names(x, operators_df)
+    with stage('geocode', rows=len(merged_df)):
+        return assign_counties(merged_df, county_cache, location_name)
+
+
+# Function to filter disruptions by the dashboard's operator, severity and date selections
+def filter_disruptions(data, operators, severities, start_date, end_date):
+    return data[(data['Operator_name'].isin(operators)) &
+                (data['Consequence Severity'].isin(severities)) &
+                (data['Start Time'] >= start_date) &
+                (data['End Time'] <= end_date)]
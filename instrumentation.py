@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# tracemalloc is process-wide, so only one thread at a time measures the peak memory of its stages
+# (which still includes whatever other threads allocate meanwhile)
+tracing_lock = threading.Lock()
+
+
+# Records wall time, row counts and optionally peak Python memory for named pipeline stages.
+# Records are kept per thread (e.g. per dashboard session) and only the latest max_records are kept.
+# Memory tracing slows Python code down several times, so it is off unless asked for.
+# Usage:
+#     with stage('parse') as record:
+#         df = ...
+#         record['rows'] = len(df)
+class Instrumentation:
+    def __init__(self, trace_memory=False, max_records=1000):
+        self.trace_memory = trace_memory
+        self.max_records = max_records
+        self.local = threading.local()
+        # Runs of every stage across all threads since start-up; never reset, so it is a true counter
+        self.runs = Counter()
+        self.runs_lock = threading.Lock()
+
+    @property
+    def records(self):
+        if not hasattr(self.local, 'records'):
+            self.local.records = deque(maxlen=self.max_records)
+        return self.local.records
+
+    @property
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {'stage': name, 'seconds': None, 'rows': rows, 'peak_memory_bytes': None}
+        # Nested stages trace along with the outermost one; other threads' stages go untraced meanwhile
+        tracing = self.trace_memory and (bool(self.stack) or tracing_lock.acquire(blocking=False))
+        if tracing:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            # Fold the peak reached so far into the enclosing stage before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak - self.stack[-1]['base'])
+            tracemalloc.reset_peak()
+            frame = {'base': current, 'peak': 0}
+            self.stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if tracing:
+                self.stack.pop()
+                current, peak = tracemalloc.get_traced_memory()
+                record['peak_memory_bytes'] = max(frame['peak'], peak - frame['base'])
+                if self.stack:
+                    parent = self.stack[-1]
+                    parent['peak'] = max(parent['peak'], peak - parent['base'])
+                if started_tracing:
+                    tracemalloc.stop()
+                if not self.stack:
+                    tracing_lock.release()
+            self.records.append(record)
+            with self.runs_lock:
+                self.runs[name] += 1
+
+    def reset(self):
+        self.records.clear()
+
+    # Return and forget the records so far, e.g. after exporting them from a long-running process
+    def drain(self):
+        records = list(self.records)
+        self.records.clear()
+        return records
+
+    # Latest record of every stage, in the order the stages first ran
+    def latest(self):
+        latest = {}
+        for record in self.records:
+            latest[record['stage']] = record
+        return list(latest.values())
+
+    def to_json(self, path=None):
+        text = json.dumps(list(self.records), indent=2)
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+    # Prometheus text exposition format, suitable for the node exporter textfile collector
+    def to_prometheus(self, path=None, prefix='bods_stage'):
+        metrics = [
+            ('seconds', 'Wall time of the latest run of the stage in seconds'),
+            ('rows', 'Rows handled by the latest run of the stage'),
+            ('peak_memory_bytes', 'Peak traced Python memory of the latest run of the stage'),
+        ]
+        lines = []
+        for key, help_text in metrics:
+            lines.append(f'# HELP {prefix}_{key} {help_text}')
+            lines.append(f'# TYPE {prefix}_{key} gauge')
+            for record in self.latest():
+                if record[key] is not None:
+                    lines.append(f'{prefix}_{key}{{stage="{record["stage"]}"}} {record[key]}')
+
+        with self.runs_lock:
+            runs = dict(self.runs)
+        lines.append(f'# HELP {prefix}_runs_total Number of runs of the stage since the process started')
+        lines.append(f'# TYPE {prefix}_runs_total counter')
+        for name, count in runs.items():
+            lines.append(f'{prefix}_runs_total{{stage="{name}"}} {count}')
+
+        text = '\n'.join(lines) + '\n'
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+
+# Shared recorder used by the scripts, the situation store and the dashboard; BODS_TRACE_MEMORY=1 adds memory
+recorder = Instrumentation(trace_memory=os.environ.get('BODS_TRACE_MEMORY') == '1')
+stage = recorder.stage
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# Missing start times are treated as "since ever" and missing end times as open-ended
+open_start = np.iinfo(np.int64).min
+open_end = np.iinfo(np.int64).max
+
+
+# Function to convert a Start/End Time column to int64 nanoseconds, replacing missing values with fill
+def to_nanoseconds(values, fill):
+    times = pd.to_datetime(pd.Series(values), utc=True, errors='coerce')
+    nanoseconds = times.dt.tz_convert(None).values.astype('datetime64[ns]').astype(np.int64)
+    nanoseconds[times.isna().values] = fill
+    return nanoseconds
+
+
+# Function to convert a query time to int64 nanoseconds
+def time_value(t):
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert('UTC').tz_localize(None)
+    return t.value
+
+
+# Centred interval tree over closed validity periods [start, end].
+# Every node keeps the intervals containing its centre twice, sorted by start and by end, so the ones
+# matching a query are a contiguous slice found with searchsorted; the others go to the left or right child.
+# Point and window queries visit O(log n) nodes plus the matches. Small nodes are leaves checked with numpy.
+class IntervalIndex:
+    def __init__(self, starts, ends, leaf_size=64):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.leaf_size = leaf_size
+        # Node arrays: centre, children, and slices into the by-start / by-end orders
+        self.centres, self.lefts, self.rights, self.slices = [], [], [], []
+        self.by_start, self.start_keys, self.by_end, self.end_keys = [], [], [], []
+        self.leaves = {}
+        self.root = self.build(np.arange(len(self.starts))) if len(self.starts) else -1
+        self.by_start = np.concatenate(self.by_start) if self.by_start else np.empty(0, dtype=np.int64)
+        self.start_keys = self.starts[self.by_start]
+        self.by_end = np.concatenate(self.by_end) if self.by_end else np.empty(0, dtype=np.int64)
+        self.end_keys = self.ends[self.by_end]
+
+    @classmethod
+    def from_frame(cls, df, start='Start Time', end='End Time', leaf_size=64):
+        return cls(to_nanoseconds(df[start], open_start), to_nanoseconds(df[end], open_end), leaf_size)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def build(self, ids):
+        node = len(self.centres)
+        self.centres.append(0)
+        self.lefts.append(-1)
+        self.rights.append(-1)
+        self.slices.append((0, 0))
+        if len(ids) <= self.leaf_size:
+            self.leaves[node] = ids
+            return node
+
+        # Median endpoint as centre; open ends are excluded so they do not drag it to the extremes
+        endpoints = np.concatenate([self.starts[ids], self.ends[ids]])
+        finite = endpoints[(endpoints != open_start) & (endpoints != open_end)]
+        centre = np.median(finite).astype(np.int64) if len(finite) else 0
+        starts, ends = self.starts[ids], self.ends[ids]
+        left = ids[ends < centre]
+        right = ids[starts > centre]
+        here = ids[(starts <= centre) & (ends >= centre)]
+        # Degenerate split (e.g. many identical intervals): keep everything in a leaf
+        if len(left) == len(ids) or len(right) == len(ids):
+            self.leaves[node] = ids
+            return node
+
+        offset = sum(len(part) for part in self.by_start)
+        self.by_start.append(here[np.argsort(self.starts[here], kind='stable')])
+        self.by_end.append(here[np.argsort(self.ends[here], kind='stable')])
+        self.centres[node] = centre
+        self.slices[node] = (offset, offset + len(here))
+        if len(left):
+            self.lefts[node] = self.build(left)
+        if len(right):
+            self.rights[node] = self.build(right)
+        return node
+
+    # Positions of the intervals overlapping the closed window [start, end], in ascending order
+    def overlapping(self, start, end):
+        return self.query(time_value(start), time_value(end))
+
+    # Same as overlapping, with the window given in int64 nanoseconds
+    def query(self, start, end):
+        found = []
+        stack = [self.root] if self.root >= 0 else []
+        while stack:
+            node = stack.pop()
+            leaf = self.leaves.get(node)
+            if leaf is not None:
+                found.append(leaf[(self.starts[leaf] <= end) & (self.ends[leaf] >= start)])
+                continue
+            centre = self.centres[node]
+            first, last = self.slices[node]
+            if end < centre:
+                # Node intervals contain the centre, so they overlap iff they start by the window end
+                stop = first + np.searchsorted(self.start_keys[first:last], end, side='right')
+                found.append(self.by_start[first:stop])
+                child = self.lefts[node]
+            elif start > centre:
+                # ... and iff they end after the window start
+                begin = first + np.searchsorted(self.end_keys[first:last], start, side='left')
+                found.append(self.by_end[begin:last])
+                child = self.rights[node]
+            else:
+                found.append(self.by_start[first:last])
+                if self.lefts[node] >= 0:
+                    stack.append(self.lefts[node])
+                child = self.rights[node]
+            if child >= 0:
+                stack.append(child)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    # Positions of the intervals active at time t
+    def at(self, t):
+        return self.overlapping(t, t)
+
+    # Boolean mask over the indexed rows, handy for combining with other filters
+    def mask(self, start, end=None):
+        mask = np.zeros(len(self.starts), dtype=bool)
+        mask[self.overlapping(start, start if end is None else end)] = True
+        return mask
@@ -0,0 +1,198 @@
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+
+from interval_index import IntervalIndex, open_end, open_start, to_nanoseconds
+
+earth_radius = 6371000.0
+metres_per_degree = 111320.0
+
+# Neighbouring grid cells compared with each cell; the other four neighbours are covered from their side
+neighbour_offsets = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+# Function to compute great-circle distances in metres between coordinate arrays
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * earth_radius * np.arcsin(np.sqrt(a))
+
+
+# Function to bucket coordinates into grid cells at least distance metres wide.
+# Returns a dict from cell to the positions in it; points within distance lie in the same or adjacent cells.
+def grid_cells(lat, lon, distance):
+    # Cells are widest in degrees of longitude at the highest latitude, so they are wide enough everywhere
+    cell_lat = distance / metres_per_degree
+    cell_lon = distance / (metres_per_degree * max(math.cos(math.radians(np.abs(lat).max())), 0.01))
+    cell_y = np.floor(lat / cell_lat).astype(np.int64)
+    cell_x = np.floor(lon / cell_lon).astype(np.int64)
+    order = np.lexsort((cell_x, cell_y))
+    keys = np.stack([cell_y[order], cell_x[order]], axis=1)
+    boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+    return {(int(group[0, 0]), int(group[0, 1])): members
+            for group, members in zip(np.split(keys, boundaries), np.split(order, boundaries))}
+
+
+# Function to find all pairs of points within distance metres of each other, each pair once
+def nearby_pairs(lat, lon, distance):
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if len(lat) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    cells = grid_cells(lat, lon, distance)
+    found_a, found_b = [], []
+    for (y, x), members in cells.items():
+        for dy, dx in neighbour_offsets:
+            others = cells.get((y + dy, x + dx))
+            if others is None:
+                continue
+            if (dy, dx) == (0, 0):
+                i, j = np.triu_indices(len(members), k=1)
+            else:
+                i, j = np.divmod(np.arange(len(members) * len(others)), len(others))
+            found_a.append(members[i])
+            found_b.append(others[j])
+    a, b = np.concatenate(found_a), np.concatenate(found_b)
+    close = haversine(lat[a], lon[a], lat[b], lon[b]) <= distance
+    return a[close], b[close]
+
+
+# Function to find pairs of positions whose intervals overlap, between the rows of two grid cells.
+# Small cell pairs are compared densely; large ones query an interval index over the second cell.
+def time_overlaps(members, others, starts, ends, same_cell, trees, key, dense_limit=4096):
+    if len(members) * len(others) <= dense_limit:
+        overlap = ((starts[members][:, None] <= ends[others][None, :]) &
+                   (ends[members][:, None] >= starts[others][None, :]))
+        if same_cell:
+            overlap = np.triu(overlap, k=1)
+        i, j = np.nonzero(overlap)
+        return members[i], others[j]
+
+    tree = trees.get(key)
+    if tree is None:
+        tree = trees[key] = IntervalIndex(starts[others], ends[others])
+    found_a, found_b = [], []
+    for n, member in enumerate(members):
+        hits = tree.query(starts[member], ends[member])
+        if same_cell:
+            # members and others are the same array: keep each pair once
+            hits = hits[hits > n]
+        found_a.append(np.full(len(hits), member))
+        found_b.append(others[hits])
+    return np.concatenate(found_a), np.concatenate(found_b)
+
+
+# Spatio-temporal join: pairs of disruptions within distance metres of each other whose validity periods
+# overlap. Coordinates are bucketed into a grid of cells at least distance wide, so only neighbouring
+# cells are compared, and time overlap is checked before the exact haversine distance.
+def overlapping_pairs(df, distance=200):
+    df = df.reset_index(drop=True)
+    located = np.flatnonzero(df['Latitude'].notna().values & df['Longitude'].notna().values)
+    lat = df['Latitude'].values[located].astype(np.float64)
+    lon = df['Longitude'].values[located].astype(np.float64)
+    starts = to_nanoseconds(df['Start Time'].values[located], open_start)
+    ends = to_nanoseconds(df['End Time'].values[located], open_end)
+
+    empty = pd.DataFrame(columns=['Situation Number A', 'Situation Number B', 'Distance (m)', 'Overlap Start',
+                                  'Overlap End'])
+    if len(located) < 2:
+        return empty
+
+    cells = grid_cells(lat, lon, distance)
+    found_a, found_b, trees = [], [], {}
+    for (y, x), members in cells.items():
+        for dy, dx in neighbour_offsets:
+            others = cells.get((y + dy, x + dx))
+            if others is None:
+                continue
+            a, b = time_overlaps(members, others, starts, ends, (dy, dx) == (0, 0), trees, (y + dy, x + dx))
+            found_a.append(a)
+            found_b.append(b)
+    if not found_a:
+        return empty
+    a, b = np.concatenate(found_a), np.concatenate(found_b)
+
+    distances = haversine(lat[a], lon[a], lat[b], lon[b])
+    close = distances <= distance
+    a, b, distances = a[close], b[close], distances[close]
+
+    numbers = df['Situation Number'].values[located]
+    overlap_start = np.maximum(starts[a], starts[b])
+    overlap_end = np.minimum(ends[a], ends[b])
+    pairs = pd.DataFrame({
+        'Situation Number A': numbers[a],
+        'Situation Number B': numbers[b],
+        'Distance (m)': distances.round(1),
+        'Overlap Start': pd.to_datetime(np.where(overlap_start == open_start, np.datetime64('NaT'),
+                                                 overlap_start.astype('datetime64[ns]')), utc=True),
+        'Overlap End': pd.to_datetime(np.where(overlap_end == open_end, np.datetime64('NaT'),
+                                               overlap_end.astype('datetime64[ns]')), utc=True),
+    })
+    return pairs.sort_values(['Situation Number A', 'Situation Number B'], ignore_index=True)
+
+
+# Function to group disruptions connected by overlapping pairs into clusters (union-find).
+# Returns a Series mapping Situation Number to a cluster id; disruptions without overlaps are left out.
+def cluster_pairs(pairs):
+    parent = {}
+
+    def find(item):
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for a, b in zip(pairs['Situation Number A'], pairs['Situation Number B']):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    roots = pd.Series({item: find(item) for item in parent}, dtype=object)
+    cluster_ids = pd.Series(pd.factorize(roots.values)[0], index=roots.index, name='Cluster')
+    cluster_ids.index.name = 'Situation Number'
+    return cluster_ids
+
+
+# Function to summarise each cluster of compounding disruptions, largest first
+def summarise_clusters(df, clusters):
+    members = df.merge(clusters.reset_index(), on='Situation Number') if len(clusters) else df.head(0)
+    if members.empty:
+        return pd.DataFrame(columns=['Cluster', 'Disruptions', 'Start Time', 'End Time', 'Latitude', 'Longitude',
+                                     'Categories', 'Operators', 'Situation Numbers'])
+    summary = members.groupby('Cluster').agg(**{
+        'Disruptions': ('Situation Number', 'size'),
+        'Start Time': ('Start Time', 'min'),
+        'End Time': ('End Time', 'max'),
+        'Latitude': ('Latitude', 'mean'),
+        'Longitude': ('Longitude', 'mean'),
+        'Categories': ('Detailed Disruption Category', lambda x: ', '.join(sorted(x.unique()))),
+        'Operators': ('Operator_name', lambda x: ', '.join(sorted(x.astype(str).unique()))),
+        'Situation Numbers': ('Situation Number', lambda x: ', '.join(x.astype(str))),
+    }).reset_index()
+    return summary.sort_values(['Disruptions', 'Start Time'], ascending=[False, True], ignore_index=True)
+
+
+# Function to run the join over the processed table and write pairs and clusters for batch use
+def export_overlaps(data_path, pairs_path, clusters_path, distance=200):
+    data = pd.read_csv(data_path)
+    data['Start Time'] = pd.to_datetime(data['Start Time'], utc=True)
+    data['End Time'] = pd.to_datetime(data['End Time'], utc=True, errors='coerce')
+    pairs = overlapping_pairs(data, distance)
+    pairs.to_csv(pairs_path, index=False)
+    summary = summarise_clusters(data, cluster_pairs(pairs))
+    summary.to_csv(clusters_path, index=False)
+    return pairs, summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find disruptions that overlap in space and time.')
+    parser.add_argument('--data', default='Data/final.csv')
+    parser.add_argument('--distance', type=float, default=200, help='Maximum distance in metres')
+    parser.add_argument('--pairs', default='Data/overlap_pairs.csv')
+    parser.add_argument('--clusters', default='Data/overlap_clusters.csv')
+    args = parser.parse_args()
+
+    pairs, summary = export_overlaps(args.data, args.pairs, args.clusters, args.distance)
+    print(f"{len(pairs)} overlapping pairs in {len(summary)} clusters")
@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from disruptions import (aggregate_situations, assign_counties, categorize, categorize_disruptions, counties,
+                         determine_county, efficient_recategorize, get_location_name, keyword_categories,
+                         merge_operator_names, prepare_rows, severity_mapping, special_codes)
+from siri_sx import columns, find_text, iter_situations, parse_situation, situation_rows
+from text_store import TextStore
+
+
+# Function to hash the content of a file
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Function to hash the code a stage depends on: source of functions, repr of constants
+def code_hash(code):
+    digest = hashlib.sha256()
+    for item in code:
+        source = inspect.getsource(item) if callable(item) else repr(item)
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+
+# One step of the pipeline with explicit input and output files.
+# The stage is skipped when its inputs, parameters and code hash to the same key as the last successful run.
+class Stage:
+    def __init__(self, name, func, inputs=(), outputs=(), code=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = [func] + list(code)
+        self.params = params or {}
+
+    def key(self):
+        digest = hashlib.sha256()
+        digest.update(self.name.encode('utf-8'))
+        digest.update(json.dumps(self.params, sort_keys=True).encode('utf-8'))
+        digest.update(code_hash(self.code).encode('utf-8'))
+        for path in self.inputs:
+            digest.update(path.encode('utf-8'))
+            digest.update(file_hash(path).encode('utf-8'))
+        return digest.hexdigest()
+
+    def run(self):
+        self.func(*self.inputs, *self.outputs, **self.params)
+
+
+# Runs stages in dependency order, concurrently where possible, skipping stages that are up to date
+class Pipeline:
+    def __init__(self, stages, manifest_path='.pipeline_cache.json', workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.manifest_path = manifest_path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+        # A stage depends on the stages producing its inputs
+        producers = {path: stage.name for stage in stages for path in stage.outputs}
+        self.dependencies = {
+            stage.name: {producers[path] for path in stage.inputs if path in producers}
+            for stage in stages
+        }
+
+    # Whether a stage can be skipped: same key as last time and its outputs unchanged since
+    def up_to_date(self, stage, key):
+        entry = self.manifest.get(stage.name)
+        if entry is None or entry['key'] != key:
+            return False
+        return all(os.path.exists(path) and file_hash(path) == entry['outputs'].get(path)
+                   for path in stage.outputs)
+
+    # Run one stage unless it is up to date; returns 'skipped' or the elapsed seconds
+    def execute(self, stage, force):
+        key = stage.key()
+        if not force and self.up_to_date(stage, key):
+            return 'skipped'
+        start = time.perf_counter()
+        stage.run()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.manifest[stage.name] = {'key': key, 'outputs': {path: file_hash(path) for path in stage.outputs}}
+            self.save_manifest()
+        return elapsed
+
+    def save_manifest(self):
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def run(self, force=False):
+        done, failed, running = set(), set(), {}
+        pending = set(self.stages)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                # Stages downstream of a failure are not run
+                for name in [name for name in pending if self.dependencies[name] & failed]:
+                    pending.discard(name)
+                    failed.add(name)
+                    print(f"{name}: not run, an upstream stage failed")
+
+                for name in [name for name in pending if self.dependencies[name] <= done]:
+                    pending.discard(name)
+                    running[executor.submit(self.execute, self.stages[name], force)] = name
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as error:
+                        failed.add(name)
+                        print(f"{name}: failed: {error!r}")
+                        continue
+                    done.add(name)
+                    print(f"{name}: {result if result == 'skipped' else f'{result:.2f} s'}")
+        if failed:
+            raise RuntimeError(f"Pipeline stages failed: {', '.join(sorted(failed))}")
+
+
+# --------------------------------  Stages  -----------------------------------
+
+# Parse the SIRI-SX snapshot into one row per affected stop
+def parse_stage(snapshot_path, stops_path):
+    data = []
+    for situation in iter_situations(snapshot_path):
+        data.extend(situation_rows(situation))
+    pd.DataFrame(data, columns=columns).to_csv(stops_path, index=False)
+
+
+# Aggregate the rows by situation and categorise every disruption
+def categorise_stage(stops_path, causes_path):
+    df = prepare_rows(pd.read_csv(stops_path, keep_default_na=False, dtype=str))
+    x = categorize_disruptions(aggregate_situations(df))
+    x.to_csv(causes_path, index=False)
+
+
+# Attach full operator names and standardise severities
+def operators_stage(causes_path, operators_path, merged_path):
+    merged_df = merge_operator_names(pd.read_csv(causes_path), pd.read_csv(operators_path))
+    merged_df.to_csv(merged_path, index=False)
+
+
+# Distinct rounded coordinates; the geocoding stage only re-runs when this set changes
+def locations_stage(causes_path, locations_path):
+    causes_df = pd.read_csv(causes_path)
+    locations = pd.DataFrame({
+        'Latitude': causes_df['Latitude'].round(5),
+        'Longitude': causes_df['Longitude'].round(5),
+    }).dropna().drop_duplicates().sort_values(['Latitude', 'Longitude'])
+    locations.to_csv(locations_path, index=False)
+
+
+# Reverse geocode every distinct location and derive its county.
+# Raw addresses from earlier runs of the same geocoder are reused; counties are derived from them on every run,
+# so a change to determine_county or the county list takes effect without geocoding again.
+def geocode_stage(locations_path, counties_path, addresses_path, geocoder):
+    addresses = {}
+    if os.path.exists(addresses_path):
+        previous = pd.read_csv(addresses_path, keep_default_na=False)
+        previous = previous[previous['Geocoder'] == geocoder]
+        addresses = dict(zip(zip(previous['Latitude'], previous['Longitude']), previous['Address']))
+
+    def location_name(lat, lon):
+        if (lat, lon) not in addresses:
+            addresses[(lat, lon)] = get_location_name(lat, lon)
+        return addresses[(lat, lon)]
+
+    locations = assign_counties(pd.read_csv(locations_path), location_name=location_name)
+    locations.to_csv(counties_path, index=False)
+    pd.DataFrame([(lat, lon, address, geocoder) for (lat, lon), address in addresses.items()],
+                 columns=['Latitude', 'Longitude', 'Address', 'Geocoder']).to_csv(addresses_path, index=False)
+
+
+# Join counties onto the operator-merged table to produce the final dataset
+def final_stage(merged_path, counties_path, final_path):
+    merged_df = pd.read_csv(merged_path)
+    counties_df = pd.read_csv(counties_path).rename(columns={'Latitude': 'Latitude Key', 'Longitude': 'Longitude Key'})
+    merged_df['Latitude Key'] = merged_df['Latitude'].round(5)
+    merged_df['Longitude Key'] = merged_df['Longitude'].round(5)
+    final_df = merged_df.merge(counties_df, on=['Latitude Key', 'Longitude Key'], how='left')
+    final_df['County'] = final_df['County'].fillna('Unknown')
+    final_df.drop(columns=['Latitude Key', 'Longitude Key']).to_csv(final_path, index=False)
+
+
+# Function to declare the stages of the preprocessing workflow
+def build_stages(snapshot_path, operators_path, data_directory='Data'):
+    def path(name):
+        return os.path.join(data_directory, name)
+
+    return [
+        Stage('parse', parse_stage, [snapshot_path], [path('stops.csv')],
+              code=[iter_situations, parse_situation, situation_rows, find_text, columns]),
+        Stage('categorise', categorise_stage, [path('stops.csv')], [path('Causes_all_disruption_data.csv')],
+              code=[prepare_rows, aggregate_situations, categorize_disruptions, categorize, efficient_recategorize,
+                    keyword_categories, TextStore]),
+        Stage('operators', operators_stage, [path('Causes_all_disruption_data.csv'), operators_path],
+              [path('operators_merged.csv')],
+              code=[merge_operator_names, severity_mapping, special_codes]),
+        Stage('locations', locations_stage, [path('Causes_all_disruption_data.csv')], [path('locations.csv')]),
+        Stage('geocode', geocode_stage, [path('locations.csv')], [path('counties.csv'), path('addresses.csv')],
+              code=[assign_counties, determine_county, counties],
+              params={'geocoder': code_hash([get_location_name])}),
+        Stage('final', final_stage, [path('operators_merged.csv'), path('counties.csv')], [path('final.csv')]),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the preprocessing pipeline, skipping up-to-date stages.')
+    parser.add_argument('--snapshot', default='Data/all disruption data/sirisx_2024-07-31_145644/sirisx.xml')
+    parser.add_argument('--operators', default='Data/bods data catalogue overall/operator_noc_data_catalogue.csv')
+    parser.add_argument('--data', default='Data', help='Directory for intermediate and final files')
+    parser.add_argument('--workers', type=int, default=4, help='Stages run at the same time')
+    parser.add_argument('--force', action='store_true', help='Run every stage even if it is up to date')
+    args = parser.parse_args()
+
+    stages = build_stages(args.snapshot, args.operators, args.data)
+    Pipeline(stages, os.path.join(args.data, '.pipeline_cache.json'), args.workers).run(force=args.force)
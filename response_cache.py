@@ -0,0 +1,25 @@
+import threading
+from collections import OrderedDict
+
+
+# Least-recently-used cache of responses, safe to share between threads.
+# The API server keys encoded responses by data version, path and canonical query; the client keys them by URL.
+class ResponseCache:
+    def __init__(self, size=256):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
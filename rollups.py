@@ -0,0 +1,112 @@
+import os
+from collections import Counter
+
+import pandas as pd
+
+# Time buckets maintained for every disruption, keyed by its Start Time
+granularities = ['hour', 'day', 'month', 'hour_of_day']
+frequencies = {'hour': 'h', 'day': 'D', 'month': 'MS'}
+dimensions = ['Consequence Severity', 'Operator_name', 'Detailed Disruption Category']
+
+
+# Function to compute the bucket of every Start Time for one granularity
+def buckets(start_times, granularity):
+    times = pd.to_datetime(start_times, utc=True, errors='coerce').dt.tz_convert(None)
+    if granularity == 'hour':
+        return times.dt.floor('h')
+    if granularity == 'day':
+        return times.dt.floor('D')
+    if granularity == 'month':
+        return times.dt.to_period('M').dt.to_timestamp()
+    if granularity == 'hour_of_day':
+        return times.dt.hour
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+# Hourly, daily and monthly disruption counts split by severity, operator and category.
+# Counts are adjusted as situations are added, updated or closed, so charts never rescan the raw rows.
+class Rollups:
+    def __init__(self):
+        self.counts = {granularity: Counter() for granularity in granularities}
+        self.frames = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        rollups = cls()
+        rollups.add(df)
+        return rollups
+
+    # Add (sign=1) or subtract (sign=-1) the contribution of processed disruption rows
+    def update(self, df, sign):
+        if df is None or len(df) == 0:
+            return
+        keys = df[dimensions].fillna('Unknown')
+        for granularity in granularities:
+            keys.insert(0, 'Bucket', buckets(df['Start Time'], granularity).values)
+            counts = self.counts[granularity]
+            for key, size in keys.dropna(subset=['Bucket']).groupby(['Bucket'] + dimensions).size().items():
+                counts[key] += sign * size
+                if counts[key] <= 0:
+                    del counts[key]
+            keys = keys.drop(columns='Bucket')
+            self.frames.pop(granularity, None)
+
+    def add(self, df):
+        self.update(df, 1)
+
+    def remove(self, df):
+        self.update(df, -1)
+
+    # Rollup table for one granularity, one row per bucket and dimension combination
+    def frame(self, granularity):
+        if granularity not in self.frames:
+            counts = self.counts[granularity]
+            frame = pd.DataFrame(list(counts.keys()), columns=['Bucket'] + dimensions)
+            frame['Count'] = list(counts.values())
+            self.frames[granularity] = frame
+        return self.frames[granularity]
+
+    # Disruption counts per bucket, optionally restricted to some severities, operators or categories
+    def series(self, granularity, severities=None, operators=None, categories=None, start=None, end=None):
+        frame = self.frame(granularity)
+        mask = pd.Series(True, index=frame.index)
+        for column, values in zip(dimensions, [severities, operators, categories]):
+            if values is not None:
+                mask &= frame[column].isin(values)
+        if start is not None:
+            mask &= frame['Bucket'] >= start
+        if end is not None:
+            mask &= frame['Bucket'] <= end
+        series = frame[mask].groupby('Bucket')['Count'].sum().sort_index()
+        # Fill empty buckets with zero like resample() does
+        if granularity in frequencies and len(series) > 0:
+            series = series.asfreq(frequencies[granularity], fill_value=0)
+        series.index.name = granularity
+        return series
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for granularity in granularities:
+            self.frame(granularity).to_csv(os.path.join(directory, f'rollup_{granularity}.csv'), index=False)
+
+    @classmethod
+    def load(cls, directory):
+        rollups = cls()
+        for granularity in granularities:
+            frame = pd.read_csv(os.path.join(directory, f'rollup_{granularity}.csv'),
+                                keep_default_na=False)
+            if granularity != 'hour_of_day':
+                frame['Bucket'] = pd.to_datetime(frame['Bucket'])
+            keys = frame[['Bucket'] + dimensions].itertuples(index=False, name=None)
+            rollups.counts[granularity] = Counter(dict(zip(keys, frame['Count'])))
+        return rollups
+
+
+# Function to load saved rollups, rebuilding them once from the processed table when missing or stale
+def load_or_build(directory, source_path):
+    saved = os.path.join(directory, 'rollup_day.csv')
+    if os.path.exists(saved) and os.path.getmtime(saved) >= os.path.getmtime(source_path):
+        return Rollups.load(directory)
+    rollups = Rollups.from_frame(pd.read_csv(source_path))
+    rollups.save(directory)
+    return rollups
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import email.utils
+import functools
+import glob
+import hashlib
+import os
+import random
+import threading
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from disruptions import process_situations
+from rollups import Rollups
+from siri_sx import SituationStreamParser
+from situation_store import SituationStore
+from text_index import TextIndex
+from text_store import TextStore
+
+
+# Function to download a SIRI-SX feed and parse it while the body is still arriving
+def fetch_feed(url, etag=None, last_modified=None, timeout=30, chunk_size=64 * 1024):
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'identity'})
+    # Conditional request headers so an unchanged feed costs a 304 and nothing else
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if last_modified:
+        request.add_header('If-Modified-Since', last_modified)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as error:
+        if error.code == 304:
+            return None, etag, last_modified
+        raise
+
+    with response:
+        parser = SituationStreamParser()
+        situations = []
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            situations.extend(parser.feed(chunk))
+        situations.extend(parser.close())
+        return (situations,
+                response.headers.get('ETag', etag),
+                response.headers.get('Last-Modified', last_modified))
+
+
+# Poller that keeps several SIRI-SX feeds in sync with a situation store
+class FeedPoller:
+    def __init__(self, urls, store=None, interval=300, max_concurrency=4, timeout=30, max_backoff=3600):
+        self.urls = list(urls)
+        self.store = store if store is not None else SituationStore()
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.validators = {url: (None, None) for url in self.urls}
+        self.failures = {url: 0 for url in self.urls}
+        # Situation numbers in the last full snapshot of each feed; with a single feed every stored situation
+        # came from it, so situations closed while the poller was down are noticed on the first poll
+        self.seen = {url: set(self.store.situations) if len(self.urls) == 1 else set() for url in self.urls}
+        self.closed = {url: [] for url in self.urls}
+        # Processing, saving and reporting run in worker threads so a slow feed (e.g. geocoding) never stalls
+        # the event loop; the store is not thread-safe, so they take turns
+        self.lock = threading.Lock()
+
+    # Poll one feed once; returns the situations that changed, or None when the feed was not modified.
+    # Situations missing from the snapshot have been closed; they are removed and kept in self.closed[url].
+    async def poll(self, url):
+        etag, last_modified = self.validators[url]
+        # Created lazily so the semaphore belongs to the running event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        async with self.semaphore:
+            situations, etag, last_modified = await loop.run_in_executor(
+                None, fetch_feed, url, etag, last_modified, self.timeout)
+        self.validators[url] = (etag, last_modified)
+        if situations is None:
+            self.closed[url] = []
+            return None
+        return await loop.run_in_executor(None, self.apply, url, situations)
+
+    # Upsert a full snapshot of one feed into the store and remove the situations it no longer carries
+    def apply(self, url, situations):
+        with self.lock:
+            changed = self.store.upsert(situations)
+
+            numbers = {situation['Situation Number'] for situation in situations}
+            # A situation another feed still carries is not closed
+            carried = set().union(*(seen for other, seen in self.seen.items() if other != url))
+            self.closed[url] = sorted(self.seen[url] - numbers - carried)
+            self.seen[url] = numbers
+            if self.closed[url]:
+                self.store.remove(self.closed[url])
+            return changed
+
+    def notify(self, on_change, url, changed, closed):
+        with self.lock:
+            on_change(url, changed, closed)
+
+    # Delay before the next poll: the regular interval, or exponential backoff with jitter after failures
+    def next_delay(self, url):
+        failures = self.failures[url]
+        if failures == 0:
+            return self.interval
+        delay = min(self.max_backoff, self.interval * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    # Keep polling one feed, optionally for a fixed number of rounds
+    async def run_feed(self, url, rounds=None, on_change=None):
+        done = 0
+        while rounds is None or done < rounds:
+            try:
+                changed = await self.poll(url)
+                self.failures[url] = 0
+                if (changed or self.closed[url]) and on_change is not None:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.notify, on_change, url, changed or [], self.closed[url])
+            except (urllib.error.URLError, OSError, ValueError, ET.ParseError) as error:
+                # A truncated or malformed document backs off this feed only; the other feeds keep polling
+                self.failures[url] += 1
+                print(f"Polling {url} failed ({self.failures[url]} in a row): {error}")
+            done += 1
+            if rounds is None or done < rounds:
+                await asyncio.sleep(self.next_delay(url))
+
+    # Poll all feeds concurrently
+    async def run(self, rounds=None, on_change=None):
+        await asyncio.gather(*(self.run_feed(url, rounds, on_change) for url in self.urls))
+
+
+# Local HTTP stand-in that replays recorded snapshots, honouring ETag and If-Modified-Since
+class SnapshotServer:
+    def __init__(self, feeds, host='127.0.0.1', port=0):
+        # feeds maps a URL path such as '/sirisx' to an ordered list of recorded snapshot files
+        self.feeds = {path: list(files) for path, files in feeds.items()}
+        self.positions = {path: 0 for path in self.feeds}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    # Build a stand-in serving every 'sirisx.xml' found under a directory of recorded snapshots
+    @classmethod
+    def from_directory(cls, directory, path='/sirisx', **kwargs):
+        files = sorted(glob.glob(os.path.join(directory, '**', 'sirisx.xml'), recursive=True))
+        return cls({path: files}, **kwargs)
+
+    def url(self, path='/sirisx'):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    # Move a feed on to its next recorded snapshot (stays on the last one once exhausted)
+    def advance(self, path='/sirisx'):
+        with self.lock:
+            self.positions[path] = min(self.positions[path] + 1, len(self.feeds[path]) - 1)
+
+    def current(self, path):
+        with self.lock:
+            snapshot = self.feeds[path][self.positions[path]]
+        with open(snapshot, 'rb') as f:
+            body = f.read()
+        return body, os.path.getmtime(snapshot)
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in stand_in.feeds:
+                    self.send_error(404)
+                    return
+                body, mtime = stand_in.current(self.path)
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                last_modified = email.utils.formatdate(mtime, usegmt=True)
+
+                # If-None-Match takes precedence over If-Modified-Since, as in RFC 9110
+                if_none_match = self.headers.get('If-None-Match')
+                since = self.headers.get('If-Modified-Since')
+                if if_none_match is not None:
+                    not_modified = if_none_match == etag
+                elif since:
+                    not_modified = email.utils.parsedate_to_datetime(since).timestamp() >= int(mtime)
+                else:
+                    not_modified = False
+
+                if not_modified:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Print a short line for every poll that brought changes
+def report_changes(url, changed, closed):
+    print(f"{url}: {len(changed)} new or updated situations, {len(closed)} closed")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Poll SIRI-SX feeds and keep only changed situations.')
+    parser.add_argument('urls', nargs='*', help='SIRI-SX feed URLs')
+    parser.add_argument('--interval', type=float, default=300, help='Seconds between polls of a feed')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum feeds fetched at the same time')
+    parser.add_argument('--rounds', type=int, default=None, help='Stop after this many polls per feed')
+    parser.add_argument('--replay', help='Serve recorded snapshots from this directory and poll them locally')
+    parser.add_argument('--operators', help='BODS operator catalogue CSV; when given, changed situations are processed')
+    parser.add_argument('--state', help='Directory where the store is loaded from and saved to after every change')
+    args = parser.parse_args()
+
+    processor = None
+    texts = TextStore()
+    if args.operators:
+        processor = functools.partial(process_situations, operators_df=pd.read_csv(args.operators), county_cache={},
+                                      texts=texts)
+    store = SituationStore(processor, Rollups(), TextIndex(), texts)
+    if args.state and os.path.exists(os.path.join(args.state, 'situations.json')):
+        store.load(args.state)
+
+    # Report every change and persist the store so a restart picks up where it left off
+    # (called in a worker thread holding the poller's store lock)
+    def on_change(url, changed, closed):
+        report_changes(url, changed, closed)
+        if args.state:
+            store.save(args.state)
+
+    stand_in = None
+    urls = args.urls
+    if args.replay:
+        stand_in = SnapshotServer.from_directory(args.replay).start()
+        urls = [stand_in.url()]
+
+    poller = FeedPoller(urls, store, interval=args.interval, max_concurrency=args.concurrency)
+    try:
+        asyncio.run(poller.run(rounds=args.rounds, on_change=on_change))
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
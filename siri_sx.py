@@ -0,0 +1,84 @@
+import xml.etree.ElementTree as ET
+
+# Define the namespace to correctly parse the XML
+ns = {'siri': 'http://www.siri.org.uk/siri'}
+SITUATION_TAG = '{http://www.siri.org.uk/siri}PtSituationElement'
+
+# Columns produced for every affected stop of a situation
+columns = [
+    'Situation Number', 'Operator', 'Summary', 'Description', 'Start Time', 'End Time',
+    'Stop Name', 'Latitude', 'Longitude', 'Planned', 'Consequence Severity'
+]
+
+
+# Function to read the text of a child element, falling back to a default when it is missing
+def find_text(element, path, default='Unknown'):
+    child = element.find(path, ns)
+    return child.text if child is not None and child.text is not None else default
+
+
+# Function to extract the fields of one PtSituationElement into a dictionary
+def parse_situation(situation):
+    return {
+        'Situation Number': find_text(situation, 'siri:SituationNumber'),
+        'Version': find_text(situation, 'siri:Version', ''),
+        'Operator': find_text(situation, './/siri:OperatorRef'),
+        'Summary': find_text(situation, 'siri:Summary'),
+        'Description': find_text(situation, 'siri:Description', ''),
+        'Start Time': find_text(situation, './/siri:StartTime'),
+        'End Time': find_text(situation, './/siri:EndTime'),
+        'Planned': find_text(situation, 'siri:Planned'),
+        'Consequence Severity': find_text(situation, './/siri:Severity'),
+        # Iterate through affected stops
+        'Stops': [
+            (find_text(stop, 'siri:StopPointName'),
+             find_text(stop, './/siri:Latitude'),
+             find_text(stop, './/siri:Longitude'))
+            for stop in situation.findall('.//siri:AffectedStopPoint', ns)
+        ],
+    }
+
+
+# Function to flatten a parsed situation into one row per affected stop
+def situation_rows(situation):
+    rows = []
+    for stop_name, lat, lon in situation['Stops']:
+        rows.append([
+            situation['Situation Number'], situation['Operator'], situation['Summary'], situation['Description'],
+            situation['Start Time'], situation['End Time'], stop_name, lat, lon,
+            situation['Planned'], situation['Consequence Severity']
+        ])
+    return rows
+
+
+# Function to stream situations out of a SIRI-SX file without building the whole tree
+def iter_situations(source):
+    for event, element in ET.iterparse(source, events=('end',)):
+        if element.tag == SITUATION_TAG:
+            yield parse_situation(element)
+            # Release the parsed element so memory stays flat on large snapshots
+            element.clear()
+
+
+# Incremental parser that is fed the response body chunk by chunk as it arrives
+class SituationStreamParser:
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=('end',))
+
+    # Feed a chunk of bytes and return the situations completed by it
+    def feed(self, chunk):
+        self.parser.feed(chunk)
+        return self._drain()
+
+    # Finish the document and return any remaining situations
+    def close(self):
+        self.parser.close()
+        return self._drain()
+
+    def _drain(self):
+        situations = []
+        for event, element in self.parser.read_events():
+            if element.tag == SITUATION_TAG:
+                situations.append(parse_situation(element))
+                element.clear()
+        return situations
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from rollups import Rollups
+from siri_sx import columns, situation_rows
+from text_index import TextIndex
+from text_store import TextStore
+
+
+# Function to fingerprint a situation from its number, SIRI version and a hash of its content
+def fingerprint(situation):
+    content = json.dumps(situation, sort_keys=True, ensure_ascii=False)
+    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return f"{situation['Situation Number']}:{situation['Version']}:{content_hash}"
+
+
+# Function to flatten situations into the same per-stop rows the parsing script produces
+def rows_frame(situations):
+    data = [row for situation in situations for row in situation_rows(situation)]
+    return pd.DataFrame(data, columns=columns)
+
+
+# Store of the latest known version of every situation.
+# When a processor is given (e.g. disruptions.process_situations with the operator catalogue bound),
+# only new and updated situations are processed and upserted into the processed table,
+# and the optional rollups.Rollups and text_index.TextIndex are kept in step with it.
+class SituationStore:
+    def __init__(self, processor=None, rollups=None, text_index=None, texts=None):
+        self.situations = {}
+        # Summary and Description are interned so repeated texts share one copy
+        self.texts = texts if texts is not None else TextStore()
+        self.fingerprints = {}
+        self.processor = processor
+        self.rollups = rollups
+        self.text_index = text_index
+        self.table = None
+
+    # Split situations into new, updated and unchanged by comparing fingerprints
+    def classify(self, situations):
+        new, updated, unchanged = [], [], []
+        # A snapshot can repeat a situation; the last occurrence wins
+        latest = {situation['Situation Number']: situation for situation in situations}
+        for number, situation in latest.items():
+            known = self.fingerprints.get(number)
+            if known is None:
+                new.append(situation)
+            elif known != fingerprint(situation):
+                updated.append(situation)
+            else:
+                unchanged.append(situation)
+        return new, updated, unchanged
+
+    # Return only the situations that are new or changed
+    def changed(self, situations):
+        new, updated, unchanged = self.classify(situations)
+        return new + updated
+
+    # Insert or replace situations, returning the ones that actually changed
+    def upsert(self, situations):
+        changed = self.changed(situations)
+        for situation in changed:
+            self.intern(situation)
+            self.situations[situation['Situation Number']] = situation
+            self.fingerprints[situation['Situation Number']] = fingerprint(situation)
+
+        if changed and self.processor is not None:
+            rows = rows_frame(changed)
+            numbers = [situation['Situation Number'] for situation in changed]
+            # Situations without affected stops produce no rows; earlier rows of them are still dropped
+            self.apply(self.processor(rows) if len(rows) > 0 else None, numbers)
+        if changed:
+            self.release_texts()
+        return changed
+
+    def intern(self, situation):
+        for field in ['Summary', 'Description']:
+            situation[field] = self.texts.canonical(situation[field])
+
+    # Drop texts of closed or updated situations once they make up most of the text store.
+    # Every situation holds at most two texts, so the check needs no scan.
+    def release_texts(self):
+        if len(self.texts) > 4 * len(self.situations) + 1024:
+            self.texts.retain(situation[field] for situation in self.situations.values()
+                              for field in ['Summary', 'Description'])
+
+    # Replace the processed rows of the given situations by new ones (None when they produce no rows)
+    def apply(self, processed, numbers):
+        self.drop_rows(numbers)
+        if processed is None or processed.empty:
+            return
+        if self.text_index is not None:
+            self.text_index.add_frame(processed)
+        if self.rollups is not None:
+            self.rollups.add(processed)
+        if self.table is None:
+            self.table = processed.reset_index(drop=True)
+        else:
+            self.table = pd.concat([self.table, processed], ignore_index=True)
+
+    # Drop the processed rows of situations, with their rollup counts and text index entries
+    def drop_rows(self, numbers):
+        if self.text_index is not None:
+            for number in numbers:
+                self.text_index.remove(number)
+        if self.table is not None:
+            removed = self.table['Situation Number'].isin(numbers)
+            if removed.any():
+                if self.rollups is not None:
+                    self.rollups.remove(self.table[removed])
+                self.table = self.table[~removed].reset_index(drop=True)
+
+    # Drop situations that have been closed or withdrawn from the feed
+    def remove(self, numbers):
+        for number in numbers:
+            self.situations.pop(number, None)
+            self.fingerprints.pop(number, None)
+        self.drop_rows(numbers)
+        self.release_texts()
+
+    # Flatten the store into the same per-stop rows the parsing script produces
+    def to_frame(self):
+        return rows_frame(self.situations.values())
+
+    # Persist the raw situations and the processed table so a restart does not reprocess everything
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'situations.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(self.situations.values()), f, ensure_ascii=False)
+        if self.table is not None:
+            self.table.to_csv(os.path.join(directory, 'final.csv'), index=False)
+        if self.rollups is not None:
+            self.rollups.save(os.path.join(directory, 'rollups'))
+        if self.text_index is not None:
+            self.text_index.save(os.path.join(directory, 'text_index.pickle'))
+
+    def load(self, directory):
+        with open(os.path.join(directory, 'situations.json'), encoding='utf-8') as f:
+            for situation in json.load(f):
+                # Stops come back from JSON as lists; store them as tuples like a fresh parse
+                situation['Stops'] = [tuple(stop) for stop in situation['Stops']]
+                self.intern(situation)
+                self.situations[situation['Situation Number']] = situation
+                self.fingerprints[situation['Situation Number']] = fingerprint(situation)
+        table_path = os.path.join(directory, 'final.csv')
+        if os.path.exists(table_path):
+            self.table = pd.read_csv(table_path)
+        if self.rollups is not None:
+            if os.path.exists(os.path.join(directory, 'rollups')):
+                self.rollups = Rollups.load(os.path.join(directory, 'rollups'))
+            elif self.table is not None:
+                self.rollups = Rollups.from_frame(self.table)
+        if self.text_index is not None:
+            if os.path.exists(os.path.join(directory, 'text_index.pickle')):
+                self.text_index = TextIndex.load(os.path.join(directory, 'text_index.pickle'))
+            elif self.table is not None:
+                self.text_index = TextIndex.from_frame(self.table)
+        return self
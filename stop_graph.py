@@ -0,0 +1,260 @@
+import argparse
+import heapq
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from interval_index import IntervalIndex
+from overlap_join import haversine, nearby_pairs
+from timetable import Stops, gtfs_seconds, read_gtfs_file
+
+# Speeds used where the timetable gives no time: buses between untimed stops, people walking between stops
+bus_speed = 5.0
+walk_speed = 1.3
+
+bus_link, walk_link = 0, 1
+
+
+# Directed stop-to-stop network in CSR form: the links leaving stop u are
+# indices[indptr[u]:indptr[u + 1]], with travel times in seconds in weights and bus/walk in kinds.
+# Bus links join consecutive stops of any trip (median scheduled time); walk links join stops close together.
+class StopGraph:
+    def __init__(self, stops, stop_times, walk_distance=400, max_cost=7200):
+        self.stops = Stops(stops)
+        self.max_cost = max_cost
+
+        stop = self.stops.codes.get_indexer(stop_times['stop_id'].astype(str))
+        trip = pd.factorize(stop_times['trip_id'])[0]
+        sequence = stop_times['stop_sequence'].values.astype(np.int64)
+        times = stop_times['departure_time'].fillna(stop_times['arrival_time'])
+        seconds = gtfs_seconds(times.fillna('0:0:0')).astype(np.float64)
+        seconds[times.isna().values] = np.nan
+        known = stop >= 0
+        stop, trip, sequence, seconds = stop[known], trip[known], sequence[known], seconds[known]
+
+        # Consecutive stops of the same trip form a bus link
+        order = np.lexsort((sequence, trip))
+        stop, trip, seconds = stop[order], trip[order], seconds[order]
+        same_trip = (trip[1:] == trip[:-1]) & (stop[1:] != stop[:-1])
+        source, target = stop[:-1][same_trip], stop[1:][same_trip]
+        duration = (seconds[1:] - seconds[:-1])[same_trip]
+        # Untimed stops get a time from the distance at bus speed
+        untimed = np.isnan(duration)
+        duration[untimed] = haversine(self.stops.lat[source[untimed]], self.stops.lon[source[untimed]],
+                                      self.stops.lat[target[untimed]], self.stops.lon[target[untimed]]) / bus_speed
+        bus = pd.DataFrame({'source': source, 'target': target, 'weight': np.maximum(duration, 1), 'kind': bus_link})
+        bus = bus.groupby(['source', 'target'], as_index=False).agg(weight=('weight', 'median'), kind=('kind', 'first'))
+
+        # Walking links both ways between stops within walk_distance
+        a, b = nearby_pairs(self.stops.lat, self.stops.lon, walk_distance)
+        walk_time = np.maximum(haversine(self.stops.lat[a], self.stops.lon[a], self.stops.lat[b],
+                                         self.stops.lon[b]) / walk_speed, 1)
+        walk = pd.DataFrame({'source': np.concatenate([a, b]), 'target': np.concatenate([b, a]),
+                             'weight': np.concatenate([walk_time, walk_time]), 'kind': walk_link})
+
+        # Where a bus and a walk link join the same stops, the faster time is kept and the link counts as bus
+        links = pd.concat([bus, walk], ignore_index=True)
+        links = links.groupby(['source', 'target'], as_index=False).agg(weight=('weight', 'min'), kind=('kind', 'min'))
+        self.indptr = np.searchsorted(links['source'].values, np.arange(len(self.stops) + 1)).astype(np.int64)
+        self.indices = links['target'].values.astype(np.int32)
+        self.weights = links['weight'].values.astype(np.float32)
+        self.kinds = links['kind'].values.astype(np.int8)
+
+        # Reverse bus links, to find where passengers enter a blocked section
+        bus_links = self.kinds == bus_link
+        sources = np.repeat(np.arange(len(self.stops)), np.diff(self.indptr))[bus_links]
+        reverse = np.lexsort((sources, self.indices[bus_links]))
+        self.reverse_indptr = np.searchsorted(self.indices[bus_links][reverse],
+                                              np.arange(len(self.stops) + 1)).astype(np.int64)
+        self.reverse_indices = sources[reverse].astype(np.int32)
+
+        # Detours already computed, keyed by the blocked stops
+        self.cache = {}
+
+    @classmethod
+    def from_gtfs(cls, source, walk_distance=400):
+        string_columns = {'stop_id': str, 'trip_id': str, 'arrival_time': str, 'departure_time': str}
+        stops = read_gtfs_file(source, 'stops.txt', dtype=string_columns)
+        stop_times = read_gtfs_file(source, 'stop_times.txt', dtype=string_columns,
+                                    usecols=['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'])
+        return cls(stops, stop_times, walk_distance)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(dict(self.__dict__, cache={}), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        graph = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            graph.__dict__.update(pickle.load(f))
+        return graph
+
+    # Dijkstra from source until every target is settled or max_cost is reached, avoiding blocked stops.
+    # Returns the cost and path (list of stops) to each reachable target.
+    def shortest_paths(self, source, targets, blocked=frozenset()):
+        remaining = set(targets)
+        costs = {source: 0.0}
+        previous = {}
+        settled = set()
+        heap = [(0.0, source)]
+        found = {}
+        while heap and remaining:
+            cost, stop = heapq.heappop(heap)
+            if stop in settled:
+                continue
+            settled.add(stop)
+            if stop in remaining:
+                remaining.discard(stop)
+                path = [stop]
+                while path[-1] != source:
+                    path.append(previous[path[-1]])
+                found[stop] = (cost, path[::-1])
+            first, last = self.indptr[stop], self.indptr[stop + 1]
+            for target, weight in zip(self.indices[first:last].tolist(), self.weights[first:last].tolist()):
+                if target in blocked or target in settled:
+                    continue
+                new_cost = cost + weight
+                if new_cost <= self.max_cost and new_cost < costs.get(target, np.inf):
+                    costs[target] = new_cost
+                    previous[target] = stop
+                    heapq.heappush(heap, (new_cost, target))
+        return found
+
+    # Stops where a bus enters the blocked stops, each with the stops where it leaves them again
+    def blocked_sections(self, blocked):
+        sections = {}
+        for stop in blocked:
+            for entry in self.reverse_indices[self.reverse_indptr[stop]:self.reverse_indptr[stop + 1]].tolist():
+                if entry in blocked or entry in sections:
+                    continue
+                # Follow bus links through the blocked stops to every stop beyond them
+                exits, seen = set(), set()
+                frontier = [target for target in self.bus_neighbours(entry) if target in blocked]
+                while frontier:
+                    current = frontier.pop()
+                    if current in seen:
+                        continue
+                    seen.add(current)
+                    for target in self.bus_neighbours(current):
+                        if target in blocked:
+                            frontier.append(target)
+                        elif target != entry:
+                            exits.add(target)
+                if exits:
+                    sections[entry] = exits
+        return sections
+
+    def bus_neighbours(self, stop):
+        first, last = self.indptr[stop], self.indptr[stop + 1]
+        return self.indices[first:last][self.kinds[first:last] == bus_link].tolist()
+
+    # Detours around a set of closed stops: for every way through them, the usual travel time, the fastest
+    # alternative avoiding them and the added time. Results are cached per set of stops.
+    def detours(self, blocked):
+        key = tuple(sorted(int(stop) for stop in blocked))
+        if key in self.cache:
+            return self.cache[key]
+        blocked = frozenset(key)
+        rows = []
+        for entry, exits in self.blocked_sections(blocked).items():
+            usual = self.shortest_paths(entry, exits)
+            alternative = self.shortest_paths(entry, exits, blocked)
+            for exit_stop in exits:
+                usual_cost = usual[exit_stop][0] if exit_stop in usual else np.nan
+                cost, path = alternative.get(exit_stop, (np.nan, []))
+                rows.append({
+                    'From Stop': self.stops.names[entry],
+                    'To Stop': self.stops.names[exit_stop],
+                    'Usual Time (min)': round(usual_cost / 60, 1),
+                    'Detour Time (min)': round(cost / 60, 1),
+                    'Added Time (min)': round((cost - usual_cost) / 60, 1),
+                    'Detour Stops': len(path),
+                    'Detour Path': ' > '.join(self.stops.names[path]),
+                    'Detour Coordinates': [[float(self.stops.lat[stop]), float(self.stops.lon[stop])]
+                                           for stop in path],
+                })
+        result = pd.DataFrame(rows, columns=['From Stop', 'To Stop', 'Usual Time (min)', 'Detour Time (min)',
+                                             'Added Time (min)', 'Detour Stops', 'Detour Path',
+                                             'Detour Coordinates'])
+        self.cache[key] = result
+        return result
+
+
+# Function to summarise the detours of one disruption in a single row
+def summarise_detours(number, stops, detours):
+    return {
+        'Situation Number': number,
+        'Closed Stops': len(stops),
+        'Ways Through': len(detours),
+        'No Alternative': int(detours['Detour Time (min)'].isna().sum()),
+        'Mean Added Time (min)': round(detours['Added Time (min)'].mean(), 1) if len(detours) else np.nan,
+        'Max Added Time (min)': detours['Added Time (min)'].max() if len(detours) else np.nan,
+    }
+
+
+# Detour computations in worker processes use a graph handed over once per process
+worker_graph = None
+
+
+def init_worker(graph):
+    global worker_graph
+    worker_graph = graph
+
+
+def worker_detours(batch):
+    return [(key, worker_graph.detours(key)) for key in batch]
+
+
+# Function to compute detours for many disruptions, in parallel processes when workers > 1.
+# Returns one summary row per disruption; the full detours end up in graph.cache.
+def batch_detours(data, graph, workers=1, radius=2000, batch_size=64):
+    closed = {}
+    for number, stop_names, lat, lon in data[['Situation Number', 'Stop Name', 'Latitude', 'Longitude']].itertuples(
+            index=False, name=None):
+        names = stop_names.split(', ') if isinstance(stop_names, str) else []
+        closed[number] = tuple(sorted(graph.stops.match(names, lat, lon, radius).tolist()))
+
+    missing = sorted({key for key in closed.values() if key and key not in graph.cache})
+    if workers > 1 and len(missing) > batch_size:
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(graph,)) as executor:
+            for results in executor.map(worker_detours, batches):
+                graph.cache.update(results)
+    return pd.DataFrame([summarise_detours(number, key, graph.detours(key)) for number, key in closed.items()],
+                        columns=['Situation Number', 'Closed Stops', 'Ways Through', 'No Alternative',
+                                 'Mean Added Time (min)', 'Max Added Time (min)'])
+
+
+# Function to load the compiled stop graph, rebuilding it from the GTFS feed when missing or stale
+def load_or_build(path, source):
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        return StopGraph.load(path)
+    graph = StopGraph.from_gtfs(source)
+    graph.save(path)
+    return graph
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute detours around the stops closed by active disruptions.')
+    parser.add_argument('timetable', help='GTFS feed directory or zip file')
+    parser.add_argument('--data', default='Data/final.csv')
+    parser.add_argument('--at', help='Only disruptions active at this time (default: all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--radius', type=float, default=2000, help='Metres between a disruption and a matching stop')
+    parser.add_argument('--output', default='Data/detours.csv')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)
+    if args.at:
+        data = data.iloc[IntervalIndex.from_frame(data).at(args.at)]
+    graph = StopGraph.from_gtfs(args.timetable)
+    summary = batch_detours(data, graph, args.workers, args.radius)
+    summary.to_csv(args.output, index=False)
+    print(f"Wrote detours for {len(summary)} disruptions to {args.output}")
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+from urllib.error import HTTPError
 import folium
 from streamlit_folium import folium_static
 from folium.plugins import MarkerCluster
@@ -16,14 +17,24 @@ from shapely.geometry import Point
 import contextily as ctx  # for adding basemaps
 from streamlit_folium import folium_static
 
-# Load the dataset
-file_path = 'Data/final.csv'
-data = pd.read_csv(file_path)
-data['Start Time'] = pd.to_datetime(data['Start Time'], utc=True)
-data['End Time'] = pd.to_datetime(data['End Time'], utc=True)
+from api_client import DisruptionAPI
+from instrumentation import recorder, stage
 
-# Add Duration in hours
-data['Duration (hours)'] = data['Duration'].apply(pd.to_numeric, errors='coerce')
+# Stage timings are collected per rerun
+recorder.reset()
+
+
+# The data lives behind api_server.py; a shared client keeps its ETag cache across reruns
+@st.cache_resource
+def get_api():
+    return DisruptionAPI()
+
+
+api = get_api()
+
+# Load the filter options (operators, severities, counties, date range)
+with stage('load'):
+    options = api.options()
 
 
 # Function to get location name from latitude and longitude
@@ -62,38 +73,75 @@ if selected_page == "Home":
     st.write(
         "Welcome to the public transport disruption information website. Use the navigation bar to explore disruptions, view details, and analyze data.")
     st.write("### Current Major Disruptions")
-    st.dataframe(data[['Summary', 'Start Time', 'End Time', 'Stop Name', 'Planned', 'Consequence Severity']].head(10))
+    # Disruptions active at the chosen moment (open-ended ones included), most severe first
+    as_of = st.date_input("Active on", value=pd.Timestamp.now(tz='UTC').date())
+    at = pd.Timestamp.now(tz='UTC').floor('min')
+    if as_of != at.date():
+        at = pd.Timestamp(as_of, tz='UTC') + pd.Timedelta(hours=12)
+    with stage('load') as record:
+        current = api.active(at=at, limit=10)
+        record['rows'] = len(current)
+    if len(current) > 0:
+        st.dataframe(current[['Summary', 'Start Time', 'End Time', 'Stop Name', 'Planned', 'Consequence Severity']])
+    else:
+        st.write("No disruptions are active at this time.")
 
 # Map View
 elif selected_page == "Map View":
     st.title("Disruption Map")
+    with stage('load') as record:
+        data = api.disruptions(columns=['Summary', 'Latitude', 'Longitude', 'Planned', 'Consequence Severity'])
+        data = data.dropna(subset=['Latitude', 'Longitude'])
+        record['rows'] = len(data)
     # Create a Folium map centered on the average latitude and longitude
     m = folium.Map(location=[data['Latitude'].mean(), data['Longitude'].mean()], zoom_start=10)
     marker_cluster = MarkerCluster().add_to(m)
 
-    # Add markers for each disruption
-    for idx, row in data.iterrows():
-        folium.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            popup=(
-                f"{row['Summary']}<br>"
-                f"Planned: {row['Planned']}<br>Consequence Severity: {row['Consequence Severity']}"
-            ),
-            icon=folium.Icon(color="red" if row['Consequence Severity'] == 'Very Severe' else "blue")
-        ).add_to(marker_cluster)
-
-    # Display the map
-    folium_static(m)
+    with stage('render', rows=len(data)):
+        # Add markers for each disruption
+        for idx, row in data.iterrows():
+            folium.Marker(
+                location=[row['Latitude'], row['Longitude']],
+                popup=(
+                    f"{row['Summary']}<br>"
+                    f"Planned: {row['Planned']}<br>Consequence Severity: {row['Consequence Severity']}"
+                ),
+                icon=folium.Icon(color="red" if row['Consequence Severity'] == 'Very Severe' else "blue")
+            ).add_to(marker_cluster)
+
+        # Display the map
+        folium_static(m)
 
 # Disruption Details
 elif selected_page == "Disruption Details":
     st.title("Disruption Details")
 
-    # County selection
-    selected_county = st.selectbox("Select County", data['County'].unique())
+    # Free-text search over summaries, descriptions and stop names
+    search_terms = st_tags(
+        label='Search Disruptions',
+        text='Add a street, stop name or keyword (prefix* allowed)',
+        value=[],
+        key='search_terms'
+    )
 
-    # Filter disruptions by selected county
-    county_disruptions = data[data['County'] == selected_county]
+    # County selection
+    selected_county = st.selectbox("Select County", ['All Counties'] + options['counties'])
+    counties = None if selected_county == 'All Counties' else [selected_county]
+
+    if search_terms:
+        # Ranked matches, best first
+        with stage('search') as record:
+            hits = api.search(' '.join(search_terms), limit=50, county=counties)
+            record['rows'] = len(hits)
+        numbers = [hit['Situation Number'] for hit in hits]
+        county_disruptions = api.disruptions(county=counties)
+        county_disruptions = county_disruptions.set_index('Situation Number').loc[numbers].reset_index()
+        st.write(f"{len(hits)} matching disruptions")
+        if len(hits) > 0:
+            st.dataframe(county_disruptions[['Summary', 'County', 'Start Time', 'Consequence Severity']])
+    else:
+        # Filter disruptions by selected county on the server
+        county_disruptions = api.disruptions(county=counties)
 
     # Disruption selection by summary
     selected_summary = st.selectbox("Select Disruption Summary", county_disruptions['Summary'].unique())
@@ -144,7 +192,7 @@ elif selected_page == "Analytics":
         with col1:
             operators = st.multiselect(
                 'Select Operators',
-                options=data['Operator_name'].unique(),
+                options=options['operators'],
                 default=['First Bus'],  # Default value
                 help="Select the bus operators to include in the analysis."
             )
@@ -152,7 +200,7 @@ elif selected_page == "Analytics":
         with col2:
             severities = st.multiselect(
                 'Select Severities',
-                options=data['Consequence Severity'].unique(),
+                options=options['severities'],
                 default=['Normal'],  # Default value
                 help="Select the severity levels to include in the analysis."
             )
@@ -162,14 +210,14 @@ elif selected_page == "Analytics":
         with col3:
             start_date = st.date_input(
                 "Start Date",
-                value=pd.to_datetime(data['Start Time']).min(),
+                value=pd.to_datetime(options['start']),
                 help="Select the start date for the analysis."
             )
 
         with col4:
             end_date = st.date_input(
                 "End Date",
-                value=pd.to_datetime(data['End Time']).max(),
+                value=pd.to_datetime(options['end']),
                 help="Select the end date for the analysis."
             )
 
@@ -177,11 +225,11 @@ elif selected_page == "Analytics":
         start_date = pd.to_datetime(start_date).tz_localize('UTC')
         end_date = pd.to_datetime(end_date).tz_localize('UTC')
 
-    # Filter data based on selections
-    filtered_data = data[(data['Operator_name'].isin(operators)) &
-                         (data['Consequence Severity'].isin(severities)) &
-                         (data['Start Time'] >= start_date) &
-                         (data['End Time'] <= end_date)]
+    # Filter data based on selections; the filtering runs on the API server
+    filters = dict(operator=operators, severity=severities, start=start_date, end=end_date)
+    with stage('filter') as record:
+        filtered_data = api.disruptions(**filters)
+        record['rows'] = len(filtered_data)
 
 
     # Sidebar for analysis type selection
@@ -195,7 +243,8 @@ elif selected_page == "Analytics":
         "Correlation with External Factors",
         "Impact on Different Demographic Groups",
         "Comparative Analysis",
-        "Severity vs. Reason Category"
+        "Severity vs. Reason Category",
+        "Compounding Disruptions"
     ]
     selected_analysis = st.sidebar.radio("Analysis Type", analysis_options)
 
@@ -208,17 +257,42 @@ elif selected_page == "Analytics":
 
         # Heatmap
         st.subheader("Heatmap of Disruptions")
-        heat_data = [[row['Latitude'], row['Longitude']] for index, row in filtered_data.iterrows()]
-        HeatMap(heat_data).add_to(m)
-        folium_static(m)
+        # Disruption counts per grid cell, aggregated by the API
+        heat_data = api.heatmap(**filters)
+        with stage('render', rows=len(heat_data)):
+            HeatMap(heat_data).add_to(m)
+            folium_static(m)
 
     # 2. Impact Analysis on Commuters
     elif selected_analysis == "Impact Analysis on Commuters":
         st.header("Impact Analysis on Commuters")
 
         st.subheader("Service Coverage Analysis")
-        # Service coverage analysis logic
-        st.write("Service coverage analysis not implemented yet.")
+        # Scheduled departures through the affected stops while each disruption is active, from the timetable
+        # loaded by the API server
+        horizon = st.number_input("Days counted for disruptions without an end time", min_value=1, max_value=90,
+                                  value=7)
+        try:
+            with stage('impact') as record:
+                total, totals, impact = api.impact(horizon=horizon, **filters)
+                record['rows'] = total
+        except HTTPError:
+            st.write("No timetable is loaded. Start api_server.py with --timetable to enable this analysis.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Scheduled Departures Affected", f"{totals['Scheduled Departures']:,}")
+            col2.metric("Scheduled Trips Affected", f"{totals['Scheduled Trips']:,}")
+            col3.metric("Timetable Stops Matched", f"{totals['Matched Stops']:,}")
+
+            if len(impact) > 0:
+                top = impact.head(20)
+                fig = px.bar(top, x='Scheduled Departures', y='Summary', color='Consequence Severity',
+                             orientation='h', title='Disruptions Affecting the Most Departures')
+                fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+                st.plotly_chart(fig)
+                st.dataframe(impact)
+                st.download_button('Download Commuter Impact', data=impact.to_csv(index=False),
+                                   file_name='commuter_impact.csv')
 
         st.subheader("Accessibility Analysis")
         # Accessibility analysis logic
@@ -229,11 +303,13 @@ elif selected_page == "Analytics":
         st.header("Temporal Analysis")
 
         st.subheader("Time Series Analysis")
+        # Daily counts come from the incrementally maintained rollups instead of resampling raw rows
+        time_series = api.timeseries('day', **filters)
+        st.line_chart(time_series)
+
         filtered_data['Start Time'] = pd.to_datetime(filtered_data['Start Time'])
         filtered_data['End Time'] = pd.to_datetime(filtered_data['End Time'])
         filtered_data['Duration'] = (filtered_data['End Time'] - filtered_data['Start Time']).dt.total_seconds() / (3600 * 24)
-        time_series = filtered_data.set_index('Start Time').resample('D').size()
-        st.line_chart(time_series)
 
         st.subheader("Duration Impact")
         fig = px.histogram(filtered_data, x='Duration')
@@ -254,13 +330,14 @@ elif selected_page == "Analytics":
             'Very Slight': 'lightblue'
         }
 
-        for i, row in filtered_data.iterrows():
-            folium.Marker(
-                location=[row['Latitude'], row['Longitude']],
-                popup=f"Severity: {row['Consequence Severity']}",
-                icon=folium.Icon(color=severity_colors.get(row['Consequence Severity'], 'blue'))
-            ).add_to(severity_map)
-        folium_static(severity_map)
+        with stage('render', rows=len(filtered_data)):
+            for i, row in filtered_data.iterrows():
+                folium.Marker(
+                    location=[row['Latitude'], row['Longitude']],
+                    popup=f"Severity: {row['Consequence Severity']}",
+                    icon=folium.Icon(color=severity_colors.get(row['Consequence Severity'], 'blue'))
+                ).add_to(severity_map)
+            folium_static(severity_map)
 
         st.subheader("Planned vs. Unplanned")
         planned_data = filtered_data[filtered_data['Planned'] == True]
@@ -279,7 +356,34 @@ elif selected_page == "Analytics":
         st.bar_chart(route_analysis)
 
         st.subheader("Alternative Route Analysis")
-        st.write("Alternative route analysis not implemented yet.")
+        # Fastest ways around the closed stops on the stop network built from the timetable
+        try:
+            with stage('detours') as record:
+                detour_summary = api.detours(**filters)
+                record['rows'] = len(detour_summary)
+        except HTTPError:
+            st.write("No timetable is loaded. Start api_server.py with --timetable to enable this analysis.")
+        else:
+            detour_summary = detour_summary[detour_summary['Ways Through'] > 0]
+            if len(detour_summary) == 0:
+                st.write("None of the selected disruptions close stops on the timetabled network.")
+            else:
+                st.dataframe(detour_summary.sort_values('Max Added Time (min)', ascending=False))
+
+                selected_summary = st.selectbox("Show Detours for Disruption", detour_summary['Summary'])
+                number = detour_summary.loc[detour_summary['Summary'] == selected_summary, 'Situation Number'].iloc[0]
+                detours = api.detour(number)
+                st.dataframe(detours.drop(columns='Detour Coordinates'))
+
+                paths = [path for path in detours['Detour Coordinates'] if path]
+                if paths:
+                    detour_map = folium.Map(location=paths[0][0], zoom_start=14)
+                    with stage('render', rows=len(paths)):
+                        for path in paths:
+                            folium.PolyLine(path, color='blue', weight=4).add_to(detour_map)
+                            folium.Marker(path[0], icon=folium.Icon(color='green')).add_to(detour_map)
+                            folium.Marker(path[-1], icon=folium.Icon(color='red')).add_to(detour_map)
+                        folium_static(detour_map)
 
     # 6. Correlation with External Factors
     elif selected_analysis == "Correlation with External Factors":
@@ -306,12 +410,12 @@ elif selected_page == "Analytics":
         st.header("Comparative Analysis")
 
         st.subheader("Inter-Operator Comparison")
-        operator_comparison = filtered_data['Operator'].value_counts()
-        st.bar_chart(operator_comparison)
+        operator_comparison = api.aggregates('Operator', **filters).set_index('Operator')['Count']
+        st.bar_chart(operator_comparison.sort_values(ascending=False))
 
         st.subheader("Regional Comparison")
-        regional_comparison = filtered_data['County'].value_counts()
-        st.bar_chart(regional_comparison)
+        regional_comparison = api.aggregates('County', **filters).set_index('County')['Count']
+        st.bar_chart(regional_comparison.sort_values(ascending=False))
     # 9. Severity vs. Reason Category Analysis
     elif selected_analysis == "Severity vs. Reason Category":
         st.header("Severity vs. Reason Category Analysis")
@@ -328,8 +432,8 @@ elif selected_page == "Analytics":
         st.plotly_chart(fig)
 
         st.subheader("Count of Severities by Reason Category")
-        severity_reason_counts = filtered_data.groupby(
-            ['Detailed Disruption Category', 'Consequence Severity']).size().reset_index(name='Counts')
+        severity_reason_counts = api.aggregates(['Detailed Disruption Category', 'Consequence Severity'],
+                                                **filters).rename(columns={'Count': 'Counts'})
         fig2 = px.bar(severity_reason_counts,
                       x='Detailed Disruption Category',
                       y='Counts',
@@ -339,6 +443,46 @@ elif selected_page == "Analytics":
                                                                 "Very Severe"]},
                       barmode='group')
         st.plotly_chart(fig2)
+    # 10. Compounding Disruptions
+    elif selected_analysis == "Compounding Disruptions":
+        st.header("Compounding Disruptions")
+        st.write("Disruptions that are close to each other and active at the same time, "
+                 "e.g. roadworks and an event on the same corridor.")
+
+        distance = st.slider("Maximum distance (metres)", min_value=50, max_value=2000, value=200, step=50)
+        with stage('overlaps') as record:
+            total_pairs, pairs, clusters = api.overlaps(distance=distance, **filters)
+            record['rows'] = total_pairs
+
+        col1, col2 = st.columns(2)
+        col1.metric("Overlapping Pairs", total_pairs)
+        col2.metric("Clusters", len(clusters))
+
+        if len(clusters) > 0:
+            st.subheader("Clusters of Overlapping Disruptions")
+            cluster_map = folium.Map(location=[clusters['Latitude'].mean(), clusters['Longitude'].mean()],
+                                     zoom_start=10)
+            with stage('render', rows=len(clusters)):
+                for i, row in clusters.iterrows():
+                    folium.CircleMarker(
+                        location=[row['Latitude'], row['Longitude']],
+                        radius=min(4 + 2 * row['Disruptions'], 30),
+                        popup=f"{row['Disruptions']} disruptions<br>{row['Categories']}",
+                        color='darkred', fill=True
+                    ).add_to(cluster_map)
+                folium_static(cluster_map)
+            st.dataframe(clusters)
+            st.download_button('Download Clusters', data=clusters.to_csv(index=False),
+                               file_name='overlap_clusters.csv')
+
+            st.subheader("Overlapping Pairs")
+            if total_pairs > len(pairs):
+                st.write(f"Showing the first {len(pairs)} of {total_pairs} pairs. "
+                         "Use overlap_join.py for a full export.")
+            st.dataframe(pairs)
+            st.download_button('Download Pairs', data=pairs.to_csv(index=False), file_name='overlap_pairs.csv')
+        else:
+            st.write("No overlapping disruptions for the selected filters.")
     # Data Table
     st.header('Data Table')
     st.dataframe(filtered_data)
@@ -353,6 +497,10 @@ elif selected_page == "User Dashboard":
     st.write("Customize your dashboard by selecting your preferences.")
 
 
+# Optional panel with the timings of this rerun
+if st.sidebar.checkbox("Show stage timings", value=False):
+    st.sidebar.dataframe(pd.DataFrame(recorder.records))
+
 # General layout and footer
 st.sidebar.title("About")
 st.sidebar.info("This is a demo website for public transport disruption information, built using Streamlit.")
@@ -0,0 +1,192 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from disruptions import counties, keyword_categories
+
+# Filler vocabulary mixed with the category keywords so texts read like operator notices
+filler_words = [
+    'due', 'to', 'the', 'on', 'between', 'and', 'from', 'until', 'further', 'notice', 'customers', 'please',
+    'use', 'alternative', 'stops', 'buses', 'will', 'be', 'affected', 'we', 'apologise', 'for', 'any',
+    'inconvenience', 'caused', 'routes', 'running', 'via', 'near', 'outside', 'opposite', 'city', 'centre'
+]
+street_words = ['High', 'Station', 'Church', 'Park', 'Victoria', 'Mill', 'Queen', 'King', 'London', 'North', 'Bridge', 'Market']
+street_types = ['Street', 'Road', 'Lane', 'Avenue', 'Way', 'Square']
+severities = ['unknown', 'normal', 'slight', 'severe', 'verySevere', 'verySlight']
+operators = [f'OP{i:02d}' for i in range(40)] + ['SYFT', 'METL', 'SPCT']
+
+# Rough bounding box of England used for stop coordinates
+lat_range = (50.0, 55.8)
+lon_range = (-5.7, 1.8)
+
+
+# Function to write a piece of free text drawing on the categorisation vocabulary
+def synthetic_text(rng, min_words, max_words):
+    keywords = rng.choice(list(keyword_categories.values()))
+    words = [rng.choice(filler_words) for _ in range(rng.randint(min_words, max_words))]
+    # Most notices mention one keyword of a category; a few mention none and fall into 'Others'
+    if rng.random() < 0.9:
+        words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+    return ' '.join(words).capitalize()
+
+
+# Function to produce the XML of one synthetic PtSituationElement
+def synthetic_situation(rng, number, stops_per_situation, text_words, start):
+    begin = start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+    end = begin + timedelta(hours=rng.randint(1, 24 * 14))
+    lat, lon = rng.uniform(*lat_range), rng.uniform(*lon_range)
+
+    stops = []
+    for _ in range(rng.randint(*stops_per_situation)):
+        name = f"{rng.choice(street_words)} {rng.choice(street_types)}"
+        stops.append(
+            '<AffectedStopPoint>'
+            f'<StopPointName>{escape(name)}</StopPointName>'
+            f'<Location><Longitude>{lon + rng.uniform(-0.01, 0.01):.6f}</Longitude>'
+            f'<Latitude>{lat + rng.uniform(-0.01, 0.01):.6f}</Latitude></Location>'
+            '</AffectedStopPoint>'
+        )
+
+    # Roughly one situation in ten is still open-ended
+    end_time = '' if rng.random() < 0.1 else f'<EndTime>{end.isoformat()}</EndTime>'
+    return (
+        '<PtSituationElement>'
+        f'<SituationNumber>SYN-{number:08d}</SituationNumber>'
+        f'<Version>{rng.randint(1, 5)}</Version>'
+        f'<Planned>{"true" if rng.random() < 0.7 else "false"}</Planned>'
+        f'<Summary>{escape(synthetic_text(rng, 3, 10))}</Summary>'
+        f'<Description>{escape(synthetic_text(rng, *text_words))}</Description>'
+        f'<ValidityPeriod><StartTime>{begin.isoformat()}</StartTime>{end_time}</ValidityPeriod>'
+        '<Consequences><Consequence>'
+        f'<Severity>{rng.choice(severities)}</Severity>'
+        '<Affects>'
+        f'<Operators><AffectedOperator><OperatorRef>{rng.choice(operators)}</OperatorRef></AffectedOperator></Operators>'
+        f'<StopPoints>{"".join(stops)}</StopPoints>'
+        '</Affects>'
+        '</Consequence></Consequences>'
+        '</PtSituationElement>\n'
+    )
+
+
+# Function to write a synthetic SIRI-SX snapshot of the requested size, streaming it to disk
+def generate(path, situations=10000, stops_per_situation=(1, 8), text_words=(10, 60), seed=0,
+             start=datetime(2023, 1, 1, tzinfo=timezone.utc)):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Siri xmlns="http://www.siri.org.uk/siri" version="2.0"><ServiceDelivery>'
+                '<SituationExchangeDelivery><Situations>\n')
+        for number in range(situations):
+            f.write(synthetic_situation(rng, number, stops_per_situation, text_words, start))
+        f.write('</Situations></SituationExchangeDelivery></ServiceDelivery></Siri>\n')
+    return path
+
+
+# Function to write an operator catalogue matching the synthetic operator codes
+def generate_operator_catalogue(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('operator_name,noc\n')
+        for code in operators[:-3]:
+            f.write(f'Operator {code},{code}\n')
+    return path
+
+
+# Offline stand-in for reverse geocoding: a deterministic county per 0.5 degree cell
+def synthetic_location_name(lat, lon):
+    cell = int((lat - lat_range[0]) // 0.5) * 31 + int((lon - lon_range[0]) // 0.5)
+    return f"Synthetic Street, {counties[cell % len(counties)]}, England"
+
+
+# Function to format seconds after midnight as GTFS times (hours may exceed 24)
+def gtfs_time(seconds):
+    codes, uniques = pd.factorize(seconds)
+    formatted = np.array([f'{value // 3600:02d}:{value // 60 % 60:02d}:{value % 60:02d}' for value in uniques])
+    return formatted[codes]
+
+
+# Function to write a synthetic GTFS feed for the timetable analyses. Stops share the street names of the
+# SIRI-SX stops; each route runs both ways through the stops nearest a random centre, at a fixed headway,
+# with weekday, Saturday and Sunday services.
+def generate_gtfs(directory, stops=50000, routes=1000, stops_per_route=(15, 40), headway_minutes=(10, 30), seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    lat = rng.uniform(*lat_range, stops)
+    lon = rng.uniform(*lon_range, stops)
+    stop_ids = np.array([f'SYN{number:07d}' for number in range(stops)])
+    names = [f'{street_words[i]} {street_types[j]}' for i, j in
+             zip(rng.integers(0, len(street_words), stops), rng.integers(0, len(street_types), stops))]
+    pd.DataFrame({'stop_id': stop_ids, 'stop_name': names, 'stop_lat': lat.round(6), 'stop_lon': lon.round(6)}).to_csv(
+        os.path.join(directory, 'stops.txt'), index=False)
+
+    services = {'WEEKDAY': [1, 1, 1, 1, 1, 0, 0], 'SATURDAY': [0, 0, 0, 0, 0, 1, 0], 'SUNDAY': [0, 0, 0, 0, 0, 0, 1]}
+    # Saturday and Sunday services run less often
+    headway_factor = {'WEEKDAY': 1, 'SATURDAY': 1.5, 'SUNDAY': 2}
+    calendar = pd.DataFrame([[service] + days + ['20230101', '20241231'] for service, days in services.items()],
+                            columns=['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                                     'saturday', 'sunday', 'start_date', 'end_date'])
+    calendar.to_csv(os.path.join(directory, 'calendar.txt'), index=False)
+    with open(os.path.join(directory, 'agency.txt'), 'w', encoding='utf-8') as f:
+        f.write('agency_id,agency_name,agency_url,agency_timezone\nSYN,Synthetic Buses,https://example.org,Europe/London\n')
+
+    route_rows, trip_rows, stop_time_parts = [], [], []
+    for route in range(routes):
+        # The stops nearest a random centre, ordered along a random direction
+        centre = rng.integers(0, stops)
+        count = rng.integers(stops_per_route[0], stops_per_route[1] + 1)
+        distances = (lat - lat[centre]) ** 2 + ((lon - lon[centre]) * 0.6) ** 2
+        members = np.argpartition(distances, count)[:count]
+        angle = rng.uniform(0, np.pi)
+        members = members[np.argsort(lat[members] * np.sin(angle) + lon[members] * 0.6 * np.cos(angle))]
+        hops = np.concatenate([[0], np.cumsum(rng.integers(60, 180, count - 1))])
+        route_id = f'R{route:05d}'
+        route_rows.append((route_id, 'SYN', str(route + 1), 3))
+
+        headway = int(rng.integers(*headway_minutes)) * 60
+        for service in services:
+            departures = np.arange(6 * 3600, 23 * 3600, int(headway * headway_factor[service]))
+            for direction, sequence in enumerate([members, members[::-1]]):
+                for departure in departures:
+                    trip_id = f'{route_id}-{service[:2]}-{direction}-{departure}'
+                    trip_rows.append((route_id, service, trip_id, direction))
+                    stop_time_parts.append((trip_id, departure + hops, sequence))
+
+    pd.DataFrame(route_rows, columns=['route_id', 'agency_id', 'route_short_name', 'route_type']).to_csv(
+        os.path.join(directory, 'routes.txt'), index=False)
+    pd.DataFrame(trip_rows, columns=['route_id', 'service_id', 'trip_id', 'direction_id']).to_csv(
+        os.path.join(directory, 'trips.txt'), index=False)
+
+    lengths = [len(times) for _, times, _ in stop_time_parts]
+    times = np.concatenate([times for _, times, _ in stop_time_parts])
+    formatted = gtfs_time(times)
+    pd.DataFrame({
+        'trip_id': np.repeat([trip_id for trip_id, _, _ in stop_time_parts], lengths),
+        'arrival_time': formatted,
+        'departure_time': formatted,
+        'stop_id': stop_ids[np.concatenate([sequence for _, _, sequence in stop_time_parts])],
+        'stop_sequence': np.concatenate([np.arange(1, length + 1) for length in lengths]),
+    }).to_csv(os.path.join(directory, 'stop_times.txt'), index=False)
+    return directory
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic SIRI-SX snapshot.')
+    parser.add_argument('output', help='Path of the XML file to write')
+    parser.add_argument('--situations', type=int, default=10000)
+    parser.add_argument('--min-stops', type=int, default=1)
+    parser.add_argument('--max-stops', type=int, default=8)
+    parser.add_argument('--min-words', type=int, default=10)
+    parser.add_argument('--max-words', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gtfs', metavar='DIRECTORY', help='Also write a synthetic GTFS timetable here')
+    parser.add_argument('--gtfs-routes', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.gtfs:
+        generate_gtfs(args.gtfs, routes=args.gtfs_routes, seed=args.seed)
+    generate(args.output, args.situations, (args.min_stops, args.max_stops), (args.min_words, args.max_words), args.seed)
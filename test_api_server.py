@@ -0,0 +1,77 @@
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pandas as pd
+import pytest
+
+from api_client import DisruptionAPI
+from api_server import create_server
+
+
+def disruption(number, operator, severity, county, start, end):
+    return {'Situation Number': number, 'Operator': 'OP01', 'Summary': f'Diversion {number}',
+            'Description': 'Road closed for roadworks', 'Start Time': start, 'End Time': end,
+            'Stop Name': 'High Street', 'Latitude': 51.45, 'Longitude': -2.58, 'Planned': True,
+            'Consequence Severity': severity, 'Duration': 24.0, 'Unknown': False,
+            'Detailed Disruption Category': 'Roadworks', 'Efficient Disruption Category': 'Service Changes',
+            'Operator_name': operator, 'County': county}
+
+
+@pytest.fixture
+def server(tmp_path):
+    pd.DataFrame([
+        disruption('A', 'Operator OP01', 'Severe', 'Bristol', '2024-07-01 08:00:00+00:00', '2024-07-02 08:00:00+00:00'),
+        disruption('B', 'Operator OP01', 'Normal', 'Devon', '2024-07-03 08:00:00+00:00', '2024-07-04 08:00:00+00:00'),
+        disruption('C', 'Operator OP02', 'Severe', 'Devon', '2024-07-05 08:00:00+00:00', None),
+    ]).to_csv(tmp_path / 'final.csv', index=False)
+    server = create_server(str(tmp_path / 'final.csv'), port=0, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def numbers(result):
+    return [row['Situation Number'] for row in result['rows']]
+
+
+def test_filters_select_matching_rows(server):
+    api = DisruptionAPI(server)
+
+    assert numbers(api.get('/disruptions')) == ['A', 'B', 'C']
+    assert numbers(api.get('/disruptions', severity=['Severe'])) == ['A', 'C']
+    assert numbers(api.get('/disruptions', severity=['Severe'], county=['Devon'])) == ['C']
+    assert numbers(api.get('/disruptions', operator=['Operator OP01'], start='2024-07-02')) == ['B']
+    assert api.get('/disruptions', limit=1)['rows'][0]['Summary'] == 'Diversion A'
+    assert numbers(api.get('/active', at='2024-07-10')) == ['C']
+
+
+def test_empty_selection_matches_nothing(server):
+    api = DisruptionAPI(server)
+
+    assert api.get('/disruptions', severity=[]) == {'total': 0, 'rows': []}
+    assert api.get('/aggregates', by='County', county=[]) == []
+    assert api.get('/disruptions', severity=['Severe'], start='')['total'] == 2
+
+
+def test_unchanged_response_is_not_modified(server):
+    with urlopen(f'{server}/disruptions?severity=Severe') as response:
+        etag = response.headers['ETag']
+        body = json.loads(response.read())
+    assert etag and numbers(body) == ['A', 'C']
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(Request(f'{server}/disruptions?severity=Severe', headers={'If-None-Match': etag}))
+    assert error.value.code == 304
+
+    with urlopen(Request(f'{server}/disruptions?severity=Normal', headers={'If-None-Match': etag})) as response:
+        assert response.status == 200
+
+    # The client answers a 304 from its own cache
+    api = DisruptionAPI(server)
+    assert api.get('/disruptions', severity=['Severe']) == api.get('/disruptions', severity=['Severe']) == body
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from chunked import aggregate_partition, chunked_counts, iter_row_chunks, partition_rows
+from disruptions import aggregate_situations, prepare_rows
+from synthetic_siri import generate
+
+
+def test_partitioned_aggregation_matches_in_memory(tmp_path):
+    snapshot = generate(str(tmp_path / 'sirisx.xml'), situations=500, stops_per_situation=(1, 8), seed=3)
+    rows = pd.concat(iter_row_chunks([snapshot], chunk_size=1000), ignore_index=True)
+    expected = aggregate_situations(prepare_rows(rows.copy()))
+
+    # Small chunks split most situations' stops across chunk boundaries, both when spilling and when reading
+    paths = partition_rows(iter_row_chunks([snapshot], chunk_size=37), str(tmp_path / 'partitions'), partitions=4)
+    assert len(paths) == 4
+    result = pd.concat([aggregate_partition(path, chunk_size=23) for path in paths], ignore_index=True)
+    result = result.sort_values('Situation Number', ignore_index=True)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_chunked_counts_match_groupby(tmp_path):
+    df = pd.DataFrame({
+        'County': ['Bristol', 'Devon', 'Bristol', None, 'Devon', 'Bristol', 'Kent'],
+        'Consequence Severity': ['Severe', 'Normal', 'Severe', 'Slight', 'Unknown', 'Unknown', 'Normal'],
+    })
+    path = tmp_path / 'final.csv'
+    df.to_csv(path, index=False)
+
+    counts = chunked_counts(path, ['County', 'Consequence Severity'], chunk_size=2)
+    pd.testing.assert_series_equal(counts, df.groupby(['County', 'Consequence Severity']).size(), check_names=False)
+    unknown = chunked_counts(path, 'County', chunk_size=3, filter=lambda chunk: chunk['Consequence Severity'] == 'Unknown')
+    assert unknown.to_dict() == {'Bristol': 1, 'Devon': 1}
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from interval_index import IntervalIndex, open_end, open_start
+
+
+# Positions of the intervals overlapping [start, end], checked one interval at a time
+def brute_force(starts, ends, start, end):
+    return [position for position, (lo, hi) in enumerate(zip(starts, ends)) if lo <= end and hi >= start]
+
+
+def random_intervals(rng, count):
+    starts = rng.integers(0, 1000, count)
+    ends = starts + rng.integers(0, 100, count)
+    # Some periods have no start or no end
+    starts[rng.random(count) < 0.05] = open_start
+    ends[rng.random(count) < 0.1] = open_end
+    return starts, ends
+
+
+@pytest.mark.parametrize('leaf_size', [1, 4, 64])
+def test_query_matches_brute_force(leaf_size):
+    rng = np.random.default_rng(0)
+    starts, ends = random_intervals(rng, 500)
+    index = IntervalIndex(starts, ends, leaf_size=leaf_size)
+
+    windows = [(t, t) for t in rng.integers(-50, 1150, 100)]
+    windows += [(lo, lo + width) for lo, width in zip(rng.integers(-50, 1150, 100), rng.integers(0, 300, 100))]
+    windows += [(open_start, 0), (1000, open_end), (open_start, open_end)]
+    for start, end in windows:
+        assert index.query(start, end).tolist() == brute_force(starts, ends, start, end)
+
+
+def test_identical_intervals_are_kept_in_one_leaf():
+    starts = np.array([10] * 200 + [5, 30])
+    ends = np.array([20] * 200 + [8, open_end])
+    index = IntervalIndex(starts, ends, leaf_size=4)
+
+    for t in [0, 5, 9, 10, 15, 20, 21, 30, 10 ** 12]:
+        assert index.query(t, t).tolist() == brute_force(starts, ends, t, t)
+    assert len(index.query(0, 100)) == 202
+
+
+def test_frame_with_missing_times():
+    df = pd.DataFrame({
+        'Start Time': ['2024-07-01T08:00:00+00:00', None, '2024-07-03T08:00:00+00:00', '2024-07-05T08:00:00+00:00'],
+        'End Time': ['2024-07-02T08:00:00+00:00', '2024-07-01T12:00:00+00:00', None, '2024-07-06T08:00:00+00:00'],
+    })
+    index = IntervalIndex.from_frame(df, leaf_size=1)
+
+    assert index.at('2024-07-01T10:00:00+00:00').tolist() == [0, 1]
+    assert index.at(pd.Timestamp('2024-07-10')).tolist() == [2]
+    assert index.overlapping('2024-07-02T09:00:00+00:00', '2024-07-05T08:00:00+00:00').tolist() == [2, 3]
+    assert index.mask('2024-06-01').tolist() == [False, True, False, False]
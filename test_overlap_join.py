@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from overlap_join import haversine, metres_per_degree, overlapping_pairs
+
+
+# Unordered pairs of disruptions within distance metres whose periods overlap, comparing every pair
+def brute_force(df, distance):
+    lat, lon = df['Latitude'].values, df['Longitude'].values
+    start = df['Start Time'].fillna(pd.Timestamp.min.tz_localize('UTC')).values
+    end = df['End Time'].fillna(pd.Timestamp.max.tz_localize('UTC')).values
+    near = haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) <= distance
+    overlap = (start[:, None] <= end[None, :]) & (end[:, None] >= start[None, :])
+    numbers = df['Situation Number'].values
+    return {frozenset([numbers[i], numbers[j]]) for i, j in zip(*np.nonzero(np.triu(near & overlap, k=1)))}
+
+
+def found(pairs):
+    return {frozenset(pair) for pair in zip(pairs['Situation Number A'], pairs['Situation Number B'])}
+
+
+def random_disruptions(count, spread, seed):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-07-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 30 * 24, count), unit='h')
+    end = start + pd.to_timedelta(rng.integers(1, 5 * 24, count), unit='h')
+    df = pd.DataFrame({
+        'Situation Number': [f'S{n:04d}' for n in range(count)],
+        'Latitude': 51.45 + rng.random(count) * spread,
+        'Longitude': -2.58 + rng.random(count) * spread,
+        'Start Time': pd.Series(start).where(rng.random(count) > 0.05),
+        'End Time': pd.Series(end).where(rng.random(count) > 0.1),
+    })
+    df.loc[rng.random(count) < 0.02, 'Latitude'] = np.nan
+    return df
+
+
+# Spread out, most cells hold a few disruptions and are compared densely; crowded, cells hold hundreds
+# and are compared through interval trees
+@pytest.mark.parametrize('spread', [0.2, 0.004])
+def test_pairs_match_brute_force(spread):
+    df = random_disruptions(600, spread, seed=4)
+    pairs = overlapping_pairs(df, distance=150)
+
+    assert len(pairs) == len(found(pairs))
+    assert found(pairs) == brute_force(df, 150)
+
+
+def test_pairs_across_cell_boundaries():
+    distance = 200
+    boundary = np.floor(51.45 / (distance / metres_per_degree)) * distance / metres_per_degree + distance / metres_per_degree
+    offset = 20 / metres_per_degree
+    df = pd.DataFrame({
+        'Situation Number': ['below', 'above', 'diagonal', 'far', 'identical'],
+        'Latitude': [boundary - offset, boundary + offset, boundary + offset, boundary + 0.01, boundary - offset],
+        'Longitude': [-2.58, -2.58, -2.58 - 2 * offset, -2.58, -2.58],
+        'Start Time': pd.to_datetime(['2024-07-01', '2024-07-02', '2024-07-02', '2024-07-01', '2024-07-01'], utc=True),
+        'End Time': pd.to_datetime(['2024-07-03', None, '2024-07-04', '2024-07-05', '2024-07-03'], utc=True),
+    })
+
+    assert found(overlapping_pairs(df, distance)) == brute_force(df, distance)
+    assert frozenset(['below', 'above']) in brute_force(df, distance)
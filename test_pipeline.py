@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import pipeline
+from synthetic_siri import generate, generate_operator_catalogue, synthetic_location_name
+
+geocoded = []
+
+
+# Offline geocoder that records every lookup
+def counting_location_name(lat, lon):
+    geocoded.append((lat, lon))
+    return synthetic_location_name(lat, lon)
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(pipeline, 'get_location_name', counting_location_name)
+    geocoded.clear()
+    snapshot = generate(str(tmp_path / 'sirisx.xml'), situations=200, seed=2)
+    operators = generate_operator_catalogue(str(tmp_path / 'operators.csv'))
+    data = tmp_path / 'Data'
+    data.mkdir()
+
+    # Run the pipeline and return the stages that actually ran
+    def run_pipeline():
+        stages = pipeline.build_stages(snapshot, operators, str(data))
+        pipeline.Pipeline(stages, os.path.join(data, '.pipeline_cache.json'), workers=2).run()
+        lines = capsys.readouterr().out.splitlines()
+        return {line.split(':')[0] for line in lines if not line.endswith('skipped')}
+
+    run_pipeline.operators = operators
+    return run_pipeline
+
+
+def test_second_run_skips_every_stage(run):
+    assert run() == {'parse', 'categorise', 'operators', 'locations', 'geocode', 'final'}
+    assert geocoded
+    geocoded.clear()
+
+    assert run() == set()
+    assert geocoded == []
+
+
+def test_operator_change_only_reruns_operators_and_final(run):
+    run()
+    geocoded.clear()
+    with open(run.operators, 'a', encoding='utf-8') as f:
+        f.write('Operator Renamed,OP01\n')
+
+    assert run() == {'operators', 'final'}
+    assert geocoded == []
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from siri_poller import FeedPoller, SnapshotServer
+from siri_sx import iter_situations
+from situation_store import SituationStore
+from synthetic_siri import generate
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    good = generate(str(tmp_path / 'good.xml'), situations=20, seed=1)
+    # A body cut off half way through, as left by a dropped connection
+    with open(good, 'rb') as f:
+        body = f.read()
+    bad = tmp_path / 'bad.xml'
+    bad.write_bytes(body[:len(body) // 2])
+    return good, str(bad)
+
+
+def test_malformed_feed_only_backs_off_itself(snapshots):
+    good, bad = snapshots
+    stand_in = SnapshotServer({'/sirisx': [good], '/bad': [bad]}).start()
+    try:
+        poller = FeedPoller([stand_in.url('/sirisx'), stand_in.url('/bad')], interval=0.01, max_backoff=0.05)
+        asyncio.run(poller.run(rounds=2))
+    finally:
+        stand_in.stop()
+
+    assert poller.failures[stand_in.url('/bad')] == 2
+    assert poller.failures[stand_in.url('/sirisx')] == 0
+    assert len(poller.store.situations) == 20
+
+
+def test_unchanged_snapshot_is_not_modified(snapshots):
+    good, bad = snapshots
+    stand_in = SnapshotServer({'/sirisx': [good]}).start()
+    try:
+        poller = FeedPoller([stand_in.url()], interval=0.01)
+        first = asyncio.run(poller.poll(stand_in.url()))
+        second = asyncio.run(poller.poll(stand_in.url()))
+    finally:
+        stand_in.stop()
+
+    assert len(first) == 20
+    assert second is None
+
+
+def test_situations_missing_from_a_snapshot_are_closed(tmp_path, snapshots):
+    good, bad = snapshots
+    # The second snapshot is the first with its last five situations withdrawn
+    with open(good, encoding='utf-8') as f:
+        lines = f.readlines()
+    later = tmp_path / 'later.xml'
+    later.write_text(''.join(lines[:-6] + lines[-1:]), encoding='utf-8')
+    os.utime(later, (os.path.getmtime(good) + 60,) * 2)
+    numbers = [situation['Situation Number'] for situation in iter_situations(good)]
+
+    stand_in = SnapshotServer({'/sirisx': [good, str(later)]}).start()
+    reported = []
+    try:
+        poller = FeedPoller([stand_in.url()], interval=0.01)
+        asyncio.run(poller.run(rounds=1))
+        stand_in.advance()
+        asyncio.run(poller.run(rounds=1, on_change=lambda url, changed, closed: reported.append(closed)))
+    finally:
+        stand_in.stop()
+
+    assert reported == [numbers[-5:]]
+    assert sorted(poller.store.situations) == numbers[:-5]
+
+
+def test_processing_does_not_block_the_event_loop(snapshots):
+    good, bad = snapshots
+    started, release, released = threading.Event(), threading.Event(), []
+
+    # A processor that takes as long as the test lets it, like a slow geocoder
+    def processor(rows):
+        started.set()
+        released.append(release.wait(5))
+        return rows.head(0)
+
+    async def main(poller):
+        polling = asyncio.create_task(poller.run(rounds=1))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        # The loop is still free to run other work while the snapshot is processed
+        await asyncio.sleep(0.01)
+        release.set()
+        await polling
+
+    stand_in = SnapshotServer({'/sirisx': [good]}).start()
+    try:
+        poller = FeedPoller([stand_in.url()], SituationStore(processor), interval=0.01)
+        asyncio.run(main(poller))
+    finally:
+        stand_in.stop()
+
+    assert released == [True]
+    assert len(poller.store.situations) == 20
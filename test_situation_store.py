@@ -0,0 +1,42 @@
+import functools
+
+import pandas as pd
+import pytest
+
+from disruptions import process_situations
+from rollups import Rollups
+from situation_store import SituationStore
+from synthetic_siri import synthetic_location_name
+from text_index import TextIndex
+
+
+def situation(number, version='1', stops=(('High Street', '51.45', '-2.58'),), description='Road closed for roadworks'):
+    return {
+        'Situation Number': number, 'Version': version, 'Operator': 'OP01', 'Summary': 'Diversion',
+        'Description': description, 'Start Time': '2024-07-01T08:00:00+00:00',
+        'End Time': '2024-07-02T08:00:00+00:00', 'Planned': 'true', 'Consequence Severity': 'normal',
+        'Stops': list(stops),
+    }
+
+
+@pytest.fixture
+def store():
+    operators = pd.DataFrame({'operator_name': ['Operator OP01'], 'noc': ['OP01']})
+    processor = functools.partial(process_situations, operators_df=operators, county_cache={},
+                                  location_name=synthetic_location_name)
+    return SituationStore(processor, Rollups(), TextIndex())
+
+
+def rollup_total(store):
+    return int(store.rollups.frame('day')['Count'].sum())
+
+
+def test_update_without_stops_drops_processed_row(store):
+    store.upsert([situation('A'), situation('B')])
+    assert rollup_total(store) == 2
+
+    store.upsert([situation('A', version='2', stops=())])
+    assert list(store.table['Situation Number']) == ['B']
+    assert rollup_total(store) == 1
+    assert 'A' not in store.text_index.documents
+    assert store.situations['A']['Version'] == '2'
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from text_index import TextIndex
+
+
+def disruption(number, summary, description='', severity='Normal', operator='Operator OP01', county='Bristol',
+               start='2024-07-01T08:00:00+00:00'):
+    return {'Situation Number': number, 'Summary': summary, 'Description': description, 'Stop Name': '',
+            'Consequence Severity': severity, 'Operator_name': operator, 'County': county, 'Start Time': start}
+
+
+def numbers(results):
+    return [number for number, score in results]
+
+
+def test_more_relevant_documents_rank_first():
+    index = TextIndex()
+    index.add(disruption('A', 'Diversion', 'Bridge closed'))
+    index.add(disruption('B', 'Bridge closure', 'Bridge works, bridge closed'))
+    index.add(disruption('C', 'Roadworks', 'Lane closed'))
+
+    results = index.search('bridge')
+    assert numbers(results) == ['B', 'A']
+    assert results[0][1] > results[1][1] > 0
+    assert numbers(index.search('closed bridge')) == ['B', 'A', 'C']
+    assert index.search('flooding') == []
+
+
+def test_trailing_star_matches_prefix():
+    index = TextIndex()
+    index.add(disruption('A', 'Bridge closed'))
+    index.add(disruption('B', 'Bridgwater diversion'))
+    index.add(disruption('C', 'Broad Street closed'))
+
+    assert sorted(numbers(index.search('bridg*'))) == ['A', 'B']
+    assert numbers(index.search('bridg')) == []
+    assert sorted(numbers(index.search('BR*'))) == ['A', 'B', 'C']
+
+
+def test_filters_restrict_results():
+    index = TextIndex()
+    index.add(disruption('A', 'Bridge closed', severity='Severe', county='Devon', start='2024-07-01T08:00:00+00:00'))
+    index.add(disruption('B', 'Bridge closed', operator='Operator OP02', start='2024-08-01T08:00:00+00:00'))
+    index.add(disruption('C', 'Bridge closed', start='2024-09-01T08:00:00+00:00'))
+
+    assert numbers(index.search('bridge', severities=['Severe'])) == ['A']
+    assert sorted(numbers(index.search('bridge', operators=['Operator OP01']))) == ['A', 'C']
+    assert sorted(numbers(index.search('bridge', counties=['Bristol']))) == ['B', 'C']
+    july_end = pd.Timestamp('2024-08-15', tz='UTC')
+    assert sorted(numbers(index.search('bridge', start=pd.Timestamp('2024-07-15', tz='UTC'), end=july_end))) == ['B']
+    assert numbers(index.search('bridge', severities=['Severe'], counties=['Bristol'])) == []
+
+
+def test_re_added_document_replaces_the_old_one():
+    index = TextIndex()
+    index.add(disruption('A', 'Bridge closed'))
+    index.add(disruption('B', 'Bridge closed'))
+    index.add(disruption('A', 'Roadworks on Broad Street', severity='Severe'))
+
+    assert numbers(index.search('bridge')) == ['B']
+    assert numbers(index.search('roadworks')) == ['A']
+    assert numbers(index.search('roadworks', severities=['Normal'])) == []
+    assert 'bridge' in index.postings and len(index.postings['bridge']) == 1
+    assert index.total_length == sum(index.lengths)
+
+
+def test_removed_document_ids_are_reused():
+    index = TextIndex()
+    for batch in range(5):
+        for number in range(10):
+            index.add(disruption(f'{batch}-{number}', f'Diversion number{number}'))
+        for number in range(10):
+            index.remove(f'{batch}-{number}')
+
+    assert len(index.numbers) == 10
+    index.add(disruption('live', 'Diversion number3'))
+    assert len(index.numbers) == 10
+    assert numbers(index.search('number3')) == ['live']
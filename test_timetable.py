@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic_siri import generate_gtfs
+from timetable import Timetable, time_span
+
+
+@pytest.fixture(scope='module')
+def timetable(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('gtfs')
+    generate_gtfs(str(directory), stops=200, routes=12, stops_per_route=(5, 15), seed=5)
+    # Exceptions on both DST changes, around the end of the calendar, and ones that change nothing
+    # (removing a day the service does not run, adding one it already runs)
+    pd.DataFrame([
+        ('WEEKDAY', '20240329', 2), ('SUNDAY', '20240401', 1), ('SATURDAY', '20240331', 1),
+        ('WEEKDAY', '20241027', 1), ('WEEKDAY', '20241028', 2), ('SUNDAY', '20241026', 1),
+        ('SATURDAY', '20241231', 1), ('WEEKDAY', '20250102', 1), ('WEEKDAY', '20241225', 2),
+        ('SATURDAY', '20240302', 1), ('SUNDAY', '20240305', 2), ('WEEKDAY', '20240305', 2), ('WEEKDAY', '20240305', 1),
+    ], columns=['service_id', 'date', 'exception_type']).to_csv(directory / 'calendar_dates.txt', index=False)
+    return Timetable.from_gtfs(str(directory))
+
+
+# The same counts as Timetable.impact, walking every service day in turn
+def impact_per_day(timetable, stops, start, end):
+    start = pd.Timestamp(start).tz_convert(timetable.timezone)
+    end = pd.Timestamp(end).tz_convert(timetable.timezone)
+    departures, trips, routes = 0, 0, set()
+    day = start.normalize().tz_localize(None) - pd.Timedelta(days=1)
+    while day <= end.normalize().tz_localize(None):
+        midnight = day.tz_localize(timetable.timezone, ambiguous=False, nonexistent='shift_forward')
+        lo = max((start - midnight).total_seconds(), 0)
+        hi = min((end - midnight).total_seconds(), time_span - 1)
+        if lo <= hi:
+            trip = timetable.trip[timetable.departures(stops, int(np.ceil(lo)), int(hi))]
+            trip = trip[timetable.services_on(day)[timetable.trip_service[trip]]]
+            departures += len(trip)
+            trips += len(np.unique(trip))
+            routes.update(timetable.trip_route[np.unique(trip)].tolist())
+        day += pd.Timedelta(days=1)
+    return {'Scheduled Departures': departures, 'Scheduled Trips': trips, 'Affected Routes': len(routes)}
+
+
+def test_bulk_day_counts_match_walking_every_day(timetable):
+    rng = np.random.default_rng(7)
+    periods = [
+        # Across the spring and autumn clock changes, starting and ending at midnight and mid-day
+        ('2024-03-29T00:00:00+00:00', '2024-04-02T00:00:00+00:00'),
+        ('2024-03-30T23:30:00+00:00', '2024-03-31T02:30:00+01:00'),
+        ('2024-10-25T10:15:00+01:00', '2024-10-29T07:45:00+00:00'),
+        ('2024-10-26T23:00:00+00:00', '2024-10-27T23:00:00+00:00'),
+        # Past the end of the calendar, where only the added dates run
+        ('2024-12-20T06:00:00+00:00', '2025-01-10T12:00:00+00:00'),
+        # Long and short ones
+        ('2023-01-01T00:00:00+00:00', '2024-12-31T23:59:59+00:00'),
+        ('2024-03-05T08:00:00+00:00', '2024-03-05T09:00:00+00:00'),
+    ]
+    for offset, hours in zip(rng.integers(0, 700 * 24, 40), rng.integers(1, 60 * 24, 40)):
+        start = pd.Timestamp('2023-01-01', tz='UTC') + pd.Timedelta(hours=int(offset), minutes=int(offset % 60))
+        periods.append((start, start + pd.Timedelta(hours=int(hours))))
+
+    for start, end in periods:
+        stops = np.unique(rng.integers(0, len(timetable.stops), rng.integers(1, 6)))
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        assert timetable.impact(stops, start, end) == impact_per_day(timetable, stops, start, end), (start, end)
+        assert timetable.impact(stops, start, end, timetable.stop_profile(stops)) == timetable.impact(stops, start, end)
+
+
+def test_service_day_counts_match_services_on(timetable):
+    for first, last in [('2024-03-01', '2024-04-30'), ('2024-10-20', '2025-01-05'), ('2022-12-25', '2023-01-08'),
+                        ('2024-03-05', '2024-03-05'), ('2025-01-02', '2025-01-31')]:
+        days = pd.date_range(first, last)
+        expected = np.sum([timetable.services_on(day) for day in days], axis=0)
+        assert timetable.service_day_counts(first, last).tolist() == expected.tolist()
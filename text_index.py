@@ -0,0 +1,198 @@
+import bisect
+import math
+import os
+import pickle
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Fields that are searchable, and the metadata kept per disruption for filtering
+text_fields = ['Summary', 'Description', 'Stop Name']
+token_pattern = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+stop_words = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or',
+              'the', 'to', 'will', 'with'}
+
+
+# Function to split free text into lower-case search terms
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return [token for token in token_pattern.findall(text.lower()) if token not in stop_words]
+
+
+# Inverted index over Summary, Description and stop names with BM25 ranking.
+# Documents are disruptions keyed by Situation Number; adding one again replaces it.
+# Document ids of removed disruptions are reused, so the per-id lists only grow with the live documents.
+# Postings are kept in dictionaries for cheap updates and compiled to arrays per term on first use.
+class TextIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.documents = {}
+        self.ids = {}
+        self.numbers = []
+        self.lengths = []
+        self.free = []
+        self.total_length = 0
+        self.vocabulary = None
+        self.compiled = {}
+        self.length_array = None
+
+    @classmethod
+    def from_frame(cls, df):
+        index = cls()
+        index.add_frame(df)
+        return index
+
+    # Add or replace the disruptions of a processed table
+    def add_frame(self, df):
+        df = df.assign(**{'Start Time': pd.to_datetime(df['Start Time'], utc=True, errors='coerce')})
+        for row in df.to_dict('records'):
+            self.add(row)
+
+    def add(self, row):
+        number = row['Situation Number']
+        if number in self.documents:
+            self.remove(number)
+        if self.free:
+            doc_id = self.free.pop()
+            self.numbers[doc_id] = number
+        else:
+            doc_id = len(self.numbers)
+            self.numbers.append(number)
+            self.lengths.append(0)
+        self.ids[number] = doc_id
+
+        start_time = row.get('Start Time')
+        if not isinstance(start_time, pd.Timestamp):
+            start_time = pd.to_datetime(start_time, utc=True, errors='coerce')
+
+        terms = Counter(term for field in text_fields for term in tokenize(row.get(field)))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+            self.compiled.pop(term, None)
+        length = sum(terms.values())
+        self.documents[number] = {
+            'terms': list(terms),
+            'Consequence Severity': row.get('Consequence Severity'),
+            'Operator_name': row.get('Operator_name'),
+            'County': row.get('County'),
+            'Start Time': start_time,
+        }
+        self.lengths[doc_id] = length
+        self.total_length += length
+        self.vocabulary = None
+        self.length_array = None
+
+    def remove(self, number):
+        document = self.documents.pop(number, None)
+        if document is None:
+            return
+        doc_id = self.ids.pop(number)
+        for term in document['terms']:
+            postings = self.postings[term]
+            del postings[doc_id]
+            self.compiled.pop(term, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths[doc_id]
+        self.lengths[doc_id] = 0
+        self.numbers[doc_id] = None
+        self.free.append(doc_id)
+        self.vocabulary = None
+        self.length_array = None
+
+    # Document ids and term frequencies of one term as arrays
+    def term_arrays(self, term):
+        if term not in self.compiled:
+            postings = self.postings[term]
+            self.compiled[term] = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                                   np.fromiter(postings.values(), dtype=np.float64, count=len(postings)))
+        return self.compiled[term]
+
+    # Expand a query term; a trailing '*' matches every indexed term with that prefix
+    def expand(self, term):
+        if not term.endswith('*'):
+            return [term] if term in self.postings else []
+        prefix = term[:-1].lower()
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + '\uffff')
+        return self.vocabulary[start:end]
+
+    # Whether a document passes the optional filters
+    def matches(self, document, severities, operators, counties, start, end):
+        if severities is not None and document['Consequence Severity'] not in severities:
+            return False
+        if operators is not None and document['Operator_name'] not in operators:
+            return False
+        if counties is not None and document['County'] not in counties:
+            return False
+        if start is not None and not document['Start Time'] >= start:
+            return False
+        if end is not None and not document['Start Time'] <= end:
+            return False
+        return True
+
+    # Ranked keyword search; returns (Situation Number, score) pairs, best first
+    def search(self, query, limit=20, severities=None, operators=None, counties=None, start=None, end=None):
+        if not self.documents:
+            return []
+        terms = []
+        for word in query.split():
+            if word.endswith('*'):
+                terms.extend(self.expand(word))
+            else:
+                terms.extend(term for token in tokenize(word) for term in self.expand(token))
+        if not terms:
+            return []
+
+        if self.length_array is None:
+            self.length_array = np.asarray(self.lengths, dtype=np.float64)
+        count = len(self.documents)
+        average_length = self.total_length / count or 1
+        norms = self.k1 * (1 - self.b + self.b * self.length_array / average_length)
+        scores = np.zeros(len(self.numbers))
+        for term in dict.fromkeys(terms):
+            ids, frequencies = self.term_arrays(term)
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[ids])
+
+        candidates = np.flatnonzero(scores)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        filtered = any(value is not None for value in [severities, operators, counties, start, end])
+        results = []
+        for doc_id in candidates:
+            number = self.numbers[doc_id]
+            if filtered and not self.matches(self.documents[number], severities, operators, counties, start, end):
+                continue
+            results.append((number, float(scores[doc_id])))
+            if len(results) == limit:
+                break
+        return results
+
+    def save(self, path):
+        # Compiled arrays are a cache and are rebuilt on demand
+        state = dict(self.__dict__, compiled={}, length_array=None)
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+
+# Function to load the saved index, rebuilding it from the processed table when missing or stale
+def load_or_build(path, source_path):
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        return TextIndex.load(path)
+    index = TextIndex.from_frame(pd.read_csv(source_path))
+    index.save(path)
+    return index
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+# Content-addressed dictionary of free texts such as Summary and Description.
+# Every distinct text is stored once and referred to by an integer ID; results computed from a text
+# (e.g. its category) are memoised per ID, so boilerplate repeated across snapshots is handled once.
+class TextStore:
+    def __init__(self):
+        self.texts = []
+        self.ids = {}
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    # ID of a text, adding it if it has not been seen before
+    def intern(self, text):
+        text_id = self.ids.get(text)
+        if text_id is None:
+            text_id = len(self.texts)
+            self.ids[text] = text_id
+            self.texts.append(text)
+        return text_id
+
+    # The stored copy of a text, so equal strings share one object in memory
+    def canonical(self, text):
+        return self.texts[self.intern(text)]
+
+    # IDs for a whole column; only the distinct values of the column are looked up
+    def intern_series(self, series):
+        codes, uniques = pd.factorize(series.fillna(''))
+        unique_ids = np.array([self.intern(text) for text in uniques], dtype=np.int64)
+        return unique_ids[codes]
+
+    def get(self, ids):
+        return [self.texts[text_id] for text_id in ids]
+
+    # Apply func once per distinct text and broadcast the results back to the column
+    def map(self, series, func, name):
+        ids = self.intern_series(series)
+        memo = self.memo.setdefault(name, {})
+        unique_ids = np.unique(ids)
+        for text_id in unique_ids:
+            if text_id not in memo:
+                memo[text_id] = func(self.texts[text_id])
+        results = np.empty(len(unique_ids), dtype=object)
+        results[:] = [memo[text_id] for text_id in unique_ids]
+        return pd.Series(results[np.searchsorted(unique_ids, ids)], index=series.index)
+
+    # Forget texts that are no longer in use, with their memoised results; the IDs of kept texts change
+    def retain(self, texts):
+        kept = [text for text in dict.fromkeys(texts) if text in self.ids]
+        old_ids = [self.ids[text] for text in kept]
+        self.texts = kept
+        self.ids = {text: text_id for text_id, text in enumerate(kept)}
+        self.memo = {name: {new: memo[old] for new, old in enumerate(old_ids) if old in memo}
+                     for name, memo in self.memo.items()}
+
+    # Replace text columns by integer ID columns in place of them, e.g. to keep a large table compact
+    def encode(self, df, columns):
+        df = df.copy()
+        for column in columns:
+            position = df.columns.get_loc(column)
+            df.insert(position, f'{column} ID', self.intern_series(df.pop(column)))
+        return df
+
+    # Turn the ID columns of the given text columns that are present back into texts
+    def decode(self, df, columns):
+        df = df.copy()
+        for column in columns:
+            if f'{column} ID' in df:
+                position = df.columns.get_loc(f'{column} ID')
+                df.insert(position, column, self.get(df.pop(f'{column} ID')))
+        return df
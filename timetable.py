@@ -0,0 +1,344 @@
+import argparse
+import io
+import os
+import pickle
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from overlap_join import haversine
+
+weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Departure times are stored per stop as stop * time_span + seconds, so one sorted array covers every stop.
+# GTFS times can run past midnight (e.g. 25:10:00), so the span is two days.
+time_span = 2 * 24 * 3600
+
+# Bumped whenever the compiled arrays change, so pickles of older timetables are rebuilt
+compiled_version = 2
+
+
+name_separators = re.compile(r'[^a-z0-9]+')
+
+
+# Function to get the weekday (Monday = 0) of datetime64 days; 1970-01-01 was a Thursday
+def weekday_of(dates):
+    return (np.asarray(dates, dtype='datetime64[D]').view('int64') - 4) % 7
+
+
+# Function to normalise a stop name so disruption stops and timetable stops compare equal
+def normalise_name(name):
+    if not isinstance(name, str):
+        return ''
+    return name_separators.sub(' ', name.lower()).strip()
+
+
+# Function to convert GTFS HH:MM:SS times to seconds after midnight; only distinct values are parsed
+def gtfs_seconds(times):
+    codes, uniques = pd.factorize(times)
+    parts = pd.Series(uniques).str.split(':', expand=True).astype(np.int64)
+    seconds = (parts[0] * 3600 + parts[1] * 60 + parts[2]).values
+    return seconds[codes]
+
+
+# Function to read one GTFS file from a feed directory or zip archive; returns None if it is absent
+def read_gtfs_file(source, name, **kwargs):
+    if os.path.isdir(source):
+        path = os.path.join(source, name)
+        return pd.read_csv(path, **kwargs) if os.path.exists(path) else None
+    with zipfile.ZipFile(source) as archive:
+        if name not in archive.namelist():
+            return None
+        return pd.read_csv(io.BytesIO(archive.read(name)), **kwargs)
+
+
+# Stops of a GTFS feed, with integer codes and a lookup by normalised name
+class Stops:
+    def __init__(self, stops):
+        self.ids = stops['stop_id'].astype(str).values
+        self.codes = pd.Index(self.ids)
+        self.names = np.asarray(stops['stop_name'], dtype=object)
+        self.lat = stops['stop_lat'].values.astype(np.float64)
+        self.lon = stops['stop_lon'].values.astype(np.float64)
+        normalised = pd.Series([normalise_name(name) for name in self.names])
+        self.by_name = {name: np.asarray(group, dtype=np.int64)
+                        for name, group in normalised.groupby(normalised).groups.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Stops matching disruption stop names, optionally only those within radius metres of a point
+    def match(self, names, lat=None, lon=None, radius=2000):
+        found = [self.by_name.get(normalise_name(name)) for name in names]
+        found = [stops for stops in found if stops is not None]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        stops = np.concatenate(found)
+        if lat is not None and lon is not None and not (pd.isna(lat) or pd.isna(lon)):
+            stops = stops[haversine(lat, lon, self.lat[stops], self.lon[stops]) <= radius]
+        return np.unique(stops)
+
+
+# Scheduled service of a GTFS feed in compact arrays.
+# Stops, trips, routes and services are integer codes; stop_times are sorted by stop and departure time,
+# so the departures at a set of stops in a time range are found with one vectorised searchsorted.
+class Timetable:
+    def __init__(self, stops, stop_times, trips, calendar=None, calendar_dates=None, timezone='Europe/London'):
+        self.version = compiled_version
+        self.timezone = timezone
+
+        self.stops = Stops(stops)
+
+        self.trip_ids = trips['trip_id'].astype(str).values
+        trip_codes = pd.Index(self.trip_ids)
+        route_codes, self.route_ids = pd.factorize(trips['route_id'].astype(str))
+        self.trip_route = route_codes.astype(np.int32)
+        service_codes, self.service_ids = pd.factorize(trips['service_id'].astype(str))
+        self.trip_service = service_codes.astype(np.int32)
+        self.load_calendar(calendar, calendar_dates)
+
+        stop = self.stops.codes.get_indexer(stop_times['stop_id'].astype(str))
+        trip = trip_codes.get_indexer(stop_times['trip_id'].astype(str))
+        times = stop_times['departure_time']
+        departure = gtfs_seconds(times.fillna('0:0:0'))
+        # Rows with unknown stops or trips, or without times (non-timepoints), cannot be scheduled
+        valid = (stop >= 0) & (trip >= 0) & times.notna().values
+        stop, trip, departure = stop[valid], trip[valid], departure[valid]
+
+        keys = stop.astype(np.int64) * time_span + departure
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.trip = trip[order].astype(np.int32)
+
+    @classmethod
+    def from_gtfs(cls, source):
+        string_columns = {'stop_id': str, 'trip_id': str, 'route_id': str, 'service_id': str}
+        stops = read_gtfs_file(source, 'stops.txt', dtype=string_columns)
+        # Only the columns needed are parsed; stop_times is by far the largest file
+        stop_times = read_gtfs_file(source, 'stop_times.txt', dtype=dict(string_columns, departure_time=str),
+                                    usecols=['trip_id', 'departure_time', 'stop_id'])
+        trips = read_gtfs_file(source, 'trips.txt', dtype=string_columns)
+        calendar = read_gtfs_file(source, 'calendar.txt', dtype={'service_id': str, 'start_date': str,
+                                                                 'end_date': str})
+        calendar_dates = read_gtfs_file(source, 'calendar_dates.txt', dtype={'service_id': str, 'date': str})
+        agency = read_gtfs_file(source, 'agency.txt')
+        timezone = 'Europe/London'
+        if agency is not None and 'agency_timezone' in agency and len(agency):
+            timezone = agency['agency_timezone'].iloc[0]
+        return cls(stops, stop_times, trips, calendar, calendar_dates, timezone)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        timetable = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            timetable.__dict__.update(pickle.load(f))
+        return timetable
+
+    def load_calendar(self, calendar, calendar_dates):
+        count = len(self.service_ids)
+        service_codes = pd.Index(self.service_ids)
+        self.service_days = np.zeros((count, 7), dtype=bool)
+        self.service_start = np.full(count, np.datetime64('1970-01-01'), dtype='datetime64[D]')
+        self.service_end = np.full(count, np.datetime64('1970-01-01'), dtype='datetime64[D]')
+        if calendar is not None:
+            codes = service_codes.get_indexer(calendar['service_id'])
+            known = codes >= 0
+            codes = codes[known]
+            self.service_days[codes] = calendar[weekdays].values[known].astype(bool)
+            self.service_start[codes] = pd.to_datetime(calendar['start_date'][known], format='%Y%m%d').values
+            self.service_end[codes] = pd.to_datetime(calendar['end_date'][known], format='%Y%m%d').values
+
+        # calendar_dates: exception_type 1 adds a service on a date, 2 removes it
+        self.exceptions = {}
+        if calendar_dates is not None:
+            codes = service_codes.get_indexer(calendar_dates['service_id'])
+            dates = pd.to_datetime(calendar_dates['date'], format='%Y%m%d').values.astype('datetime64[D]')
+            for code, date, kind in zip(codes, dates, calendar_dates['exception_type']):
+                if code >= 0:
+                    self.exceptions.setdefault(date, []).append((code, int(kind) == 1))
+
+        # The same exceptions as changes to the regular calendar (+1 adds a day, -1 removes one), sorted by date,
+        # so the service days in a date range are counted without walking the days
+        changes = {}
+        for date, exceptions in self.exceptions.items():
+            for code, added in exceptions:
+                changes[date, code] = added
+        dates = np.array([date for date, code in changes], dtype='datetime64[D]')
+        codes = np.array([code for date, code in changes], dtype=np.int64)
+        added = np.fromiter(changes.values(), dtype=bool, count=len(changes))
+        regular = self.service_days[codes, weekday_of(dates)] & (self.service_start[codes] <= dates) & (
+            self.service_end[codes] >= dates)
+        order = np.argsort(dates, kind='stable')
+        self.change_dates = dates[order]
+        self.change_services = codes[order]
+        self.change_delta = (added.astype(np.int64) - regular)[order]
+
+    # Services running on a date, as a boolean array over service codes
+    def services_on(self, date):
+        date = np.datetime64(date, 'D')
+        active = self.service_days[:, int(weekday_of(date))] & (self.service_start <= date) & (self.service_end >= date)
+        for code, added in self.exceptions.get(date, []):
+            active[code] = added
+        return active
+
+    # Number of days each service runs between two dates (inclusive), from weekday counts and exceptions
+    def service_day_counts(self, first, last):
+        first, last = np.datetime64(first, 'D'), np.datetime64(last, 'D')
+        lo = np.maximum(self.service_start, first)
+        days = np.maximum((np.minimum(self.service_end, last) - lo).astype(np.int64) + 1, 0)
+        # Each weekday occurs days // 7 times, plus once more for the first days % 7 weekdays from lo
+        offset = (np.arange(7)[None, :] - weekday_of(lo)[:, None]) % 7
+        occurrences = days[:, None] // 7 + (offset < days[:, None] % 7)
+        counts = (self.service_days * occurrences).sum(axis=1)
+        i = np.searchsorted(self.change_dates, first, side='left')
+        j = np.searchsorted(self.change_dates, last, side='right')
+        return counts + np.bincount(self.change_services[i:j], weights=self.change_delta[i:j],
+                                    minlength=len(counts)).astype(np.int64)
+
+    def match_stops(self, names, lat=None, lon=None, radius=2000):
+        return self.stops.match(names, lat, lon, radius)
+
+    # Positions in the sorted stop_times of departures at the given stops between lo and hi seconds
+    def departures(self, stops, lo, hi):
+        stops = np.asarray(stops, dtype=np.int64)
+        first = np.searchsorted(self.keys, stops * time_span + lo, side='left')
+        last = np.searchsorted(self.keys, stops * time_span + hi, side='right')
+        lengths = last - first
+        total = lengths.sum()
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the ranges [first, last) without a Python loop
+        starts = np.repeat(first - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return starts + np.arange(total)
+
+    # Departures and distinct trips per service at the given stops over a whole service day,
+    # and the routes of each service serving them
+    def stop_profile(self, stops):
+        trip = self.trip[self.departures(stops, 0, time_span - 1)]
+        count = len(self.service_ids)
+        departures = np.bincount(self.trip_service[trip], minlength=count)
+        unique_trips = np.unique(trip)
+        trips = np.bincount(self.trip_service[unique_trips], minlength=count)
+        pairs = np.unique(np.stack([self.trip_service[unique_trips], self.trip_route[unique_trips]]), axis=1)
+        return departures, trips, pairs
+
+    # Scheduled departures, distinct trips and routes serving the stops between two times.
+    # Service days are in the feed's timezone; times past midnight belong to the previous day. Days only partly
+    # covered (at most two at either end) are counted one by one, the whole days between them at once from
+    # how often each service runs in that range. profile is stop_profile(stops) when already known.
+    def impact(self, stops, start, end, profile=None):
+        result = {'Scheduled Departures': 0, 'Scheduled Trips': 0, 'Affected Routes': 0}
+        if len(stops) == 0 or pd.isna(start) or pd.isna(end) or end < start:
+            return result
+        start = pd.Timestamp(start).tz_convert(self.timezone)
+        end = pd.Timestamp(end).tz_convert(self.timezone)
+
+        def window(day):
+            midnight = day.tz_localize(self.timezone, ambiguous=False, nonexistent='shift_forward')
+            return max((start - midnight).total_seconds(), 0), min((end - midnight).total_seconds(), time_span - 1)
+
+        def whole(day):
+            return window(day) == (0, time_span - 1)
+
+        first_day = start.normalize().tz_localize(None) - pd.Timedelta(days=1)
+        last_day = end.normalize().tz_localize(None)
+        # Whole days form one run between the partly covered days at either end
+        partial = []
+        day = first_day
+        while day <= last_day and not whole(day):
+            partial.append(day)
+            day += pd.Timedelta(days=1)
+        first_whole = day
+        day = last_day
+        while day >= first_whole and not whole(day):
+            partial.append(day)
+            day -= pd.Timedelta(days=1)
+        last_whole = day
+
+        routes = set()
+        for day in partial:
+            lo, hi = window(day)
+            if lo > hi:
+                continue
+            services = self.services_on(day)
+            trip = self.trip[self.departures(stops, int(np.ceil(lo)), int(hi))]
+            trip = trip[services[self.trip_service[trip]]]
+            unique_trips = np.unique(trip)
+            result['Scheduled Departures'] += len(trip)
+            result['Scheduled Trips'] += len(unique_trips)
+            routes.update(self.trip_route[unique_trips].tolist())
+
+        if first_whole <= last_whole:
+            departures, trips, pairs = profile if profile is not None else self.stop_profile(stops)
+            days = self.service_day_counts(first_whole, last_whole)
+            result['Scheduled Departures'] += int(days @ departures)
+            result['Scheduled Trips'] += int(days @ trips)
+            routes.update(pairs[1][days[pairs[0]] > 0].tolist())
+        result['Affected Routes'] = len(routes)
+        return result
+
+
+# Function to load the compiled timetable, rebuilding it from the GTFS feed when missing or stale
+def load_or_build(path, source):
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+        timetable = Timetable.load(path)
+        if getattr(timetable, 'version', None) == compiled_version:
+            return timetable
+    timetable = Timetable.from_gtfs(source)
+    timetable.save(path)
+    return timetable
+
+
+# Function to compute the scheduled service hit by every disruption of a processed table.
+# Open-ended disruptions are counted for horizon_days from their start.
+def commuter_impact(data, timetable, horizon_days=7, radius=2000):
+    records = []
+    horizon = pd.Timedelta(days=horizon_days)
+    # Disruptions often close the same stops, so each set of stops is profiled once
+    profiles = {}
+    for row in data[['Situation Number', 'Stop Name', 'Latitude', 'Longitude', 'Start Time', 'End Time']].itertuples(
+            index=False, name=None):
+        number, stop_names, lat, lon, start, end = row
+        if pd.isna(end) and not pd.isna(start):
+            end = start + horizon
+        names = stop_names.split(', ') if isinstance(stop_names, str) else []
+        stops = timetable.match_stops(names, lat, lon, radius)
+        key = tuple(stops.tolist())
+        if key not in profiles:
+            profiles[key] = timetable.stop_profile(stops)
+        impact = timetable.impact(stops, start, end, profiles[key])
+        days = (end - start).total_seconds() / 86400 if not (pd.isna(start) or pd.isna(end)) else np.nan
+        records.append({
+            'Situation Number': number,
+            'Matched Stops': len(stops),
+            **impact,
+            'Departures per Day': round(impact['Scheduled Departures'] / days, 1) if days and days > 0 else np.nan,
+        })
+    return pd.DataFrame(records, columns=['Situation Number', 'Matched Stops', 'Scheduled Departures',
+                                          'Scheduled Trips', 'Affected Routes', 'Departures per Day'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count scheduled departures and trips hit by each disruption.')
+    parser.add_argument('timetable', help='GTFS feed directory or zip file')
+    parser.add_argument('--data', default='Data/final.csv')
+    parser.add_argument('--output', default='Data/commuter_impact.csv')
+    parser.add_argument('--horizon', type=float, default=7, help='Days counted for open-ended disruptions')
+    parser.add_argument('--radius', type=float, default=2000, help='Metres between a disruption and a matching stop')
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)
+    data['Start Time'] = pd.to_datetime(data['Start Time'], utc=True)
+    data['End Time'] = pd.to_datetime(data['End Time'], utc=True, errors='coerce')
+    impact = commuter_impact(data, Timetable.from_gtfs(args.timetable), args.horizon, args.radius)
+    impact.to_csv(args.output, index=False)
+    print(f"Wrote {len(impact)} rows to {args.output}")